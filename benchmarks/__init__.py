@@ -0,0 +1,6 @@
+# Benchmarks are run from the repository root, e.g. python -m benchmarks.tokenizer_bench.
+# Make the compiler package importable without installing it.
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
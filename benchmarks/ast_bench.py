@@ -0,0 +1,161 @@
+"""Object tree vs. ast.Arena benchmarks.
+
+Usage: python -m benchmarks.ast_bench [--sizes=100K,1M]
+
+The generated corpora use undeclared names, so this generates its own programs: chains of
+variable declarations that both the type checker and the interpreter accept. For every size it
+reports the time to type check, interpret, walk and pickle both forms of the same AST, and the
+memory each form takes. The arena is type checked and interpreted through Arena.view.
+"""
+
+from collections.abc import Callable, Iterator
+import pickle
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+from benchmarks.tokenizer_bench import MIN_TIME, parse_size
+import compiler.ast as ast
+from compiler.interpreter import interpret
+from compiler.parser import parse
+from compiler.tokenizer import tokenize_to_buffer
+from compiler.type_checker import typecheck
+
+
+def declarations(size: int, seed: int = 0) -> str:
+    """A program of at least `size` characters that declares v0, v1, ... from the earlier
+    ones. The interpreter only finds names that are operands of the initializer itself, so
+    the earlier variable is the last operand and the others are literals."""
+    rng = random.Random(seed)
+    parts = ["var v0: Int = 1;\n"]
+    length = len(parts[0])
+    i = 1
+    while length < size:
+        operand = f"v{rng.randrange(i)}"
+        literals = " + ".join(str(rng.randrange(100)) for _ in range(rng.randint(1, 4)))
+        part = rng.choice(
+            [
+                f"var v{i} = {literals} + {operand};\n",
+                f"var v{i}: Int = ({literals}) - {operand};\n",
+                f"var v{i} = {literals};\n",
+            ]
+        )
+        parts.append(part)
+        length += len(part)
+        i += 1
+    return "".join(parts)
+
+
+def walk_tree(node: ast.Expression) -> Iterator[ast.Expression]:
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        match node:
+            case ast.BinaryOp():
+                stack += (node.right, node.left)
+            case ast.UnaryOp():
+                stack.append(node.right)
+            case ast.Conditional():
+                if node.cond_else is not None:
+                    stack.append(node.cond_else)
+                stack += (node.then, node.cond_if)
+            case ast.FunctionCall():
+                stack.extend(reversed(node.arguments))
+            case ast.Block():
+                if node.result is not None and node.result is not ast.NO_RESULT:
+                    stack.append(node.result)
+                stack.extend(reversed(node.statements))
+            case ast.VariableDeclaration():
+                stack.append(node.initializer)
+            case ast.While():
+                stack += (node.body, node.cond)
+
+
+def seconds(function: Callable[[], object]) -> float:
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        function()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_TIME:
+            return elapsed / runs
+
+
+def memory(function: Callable[[], object]) -> int:
+    tracemalloc.start()
+    result = function()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main() -> int:
+    sizes = ["100K", "1M"]
+    for arg in sys.argv[1:]:
+        if (m := re.fullmatch(r"--sizes=(.+)", arg)) is not None:
+            sizes = m[1].split(",")
+        else:
+            print(f"Unknown argument: {arg}", file=sys.stderr)
+            return 1
+
+    print(f"{'benchmark':<24} {'tree':>12} {'arena':>12} {'speedup':>8}")
+    for size in sizes:
+        tokens = tokenize_to_buffer(declarations(parse_size(size)))
+        tree = parse(tokens)
+        arena = ast.Arena()
+        root = arena.add(tree)
+        # locations are read eagerly by Arena.add, so they're resolved in both forms
+        assert arena.tree(root) == tree
+
+        tree_pickle = pickle.dumps(tree, pickle.HIGHEST_PROTOCOL)
+        arena_pickle = pickle.dumps(arena, pickle.HIGHEST_PROTOCOL)
+        rows = [
+            ("typecheck", lambda: typecheck(tree), lambda: typecheck(arena.view(root))),
+            ("interpret", lambda: interpret(tree), lambda: interpret(arena.view(root))),
+            (
+                "walk",
+                lambda: sum(1 for _ in walk_tree(tree)),
+                lambda: sum(1 for _ in arena.walk(root)),
+            ),
+            (
+                "pickle",
+                lambda: pickle.dumps(tree, pickle.HIGHEST_PROTOCOL),
+                lambda: pickle.dumps(arena, pickle.HIGHEST_PROTOCOL),
+            ),
+            ("unpickle", lambda: pickle.loads(tree_pickle), lambda: pickle.loads(arena_pickle)),
+        ]
+
+        print(f"{size} ({len(arena):,} nodes)")
+        for name, tree_function, arena_function in rows:
+            tree_seconds = seconds(tree_function)
+            arena_seconds = seconds(arena_function)
+            print(
+                f"  {name:<22} {tree_seconds * 1000:>10.1f}ms {arena_seconds * 1000:>10.1f}ms"
+                f" {tree_seconds / arena_seconds:>7.2f}x"
+            )
+
+        def build_arena() -> ast.Arena:
+            arena = ast.Arena()
+            arena.add(tree)
+            return arena
+
+        tree_memory = memory(lambda: pickle.loads(tree_pickle))
+        arena_memory = memory(build_arena)
+        print(
+            f"  {'memory':<22} {tree_memory / 1e6:>10.1f}MB {arena_memory / 1e6:>10.1f}MB"
+            f" {tree_memory / arena_memory:>7.2f}x"
+        )
+        print(
+            f"  {'pickled size':<22} {len(tree_pickle) / 1e6:>10.1f}MB"
+            f" {len(arena_pickle) / 1e6:>10.1f}MB {len(tree_pickle) / len(arena_pickle):>7.2f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
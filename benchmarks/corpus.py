@@ -0,0 +1,85 @@
+"""Deterministic generated programs for benchmarks.
+
+Every corpus is a sequence of top-level statements that tokenizes and parses; the same kind,
+size and seed always give the same program.
+"""
+
+from collections.abc import Callable
+import random
+
+type Statement = Callable[[random.Random], str]
+
+
+def _name(rng: random.Random) -> str:
+    return rng.choice(["value", "counter", "total", "item_count", "x", "_tmp"]) + (
+        f"_{rng.randrange(1000)}"
+    )
+
+
+def _identifiers(rng: random.Random) -> str:
+    names = " + ".join(_name(rng) for _ in range(rng.randint(1, 4)))
+    return rng.choice(
+        [
+            f"var {_name(rng)} = {names};\n",
+            f"{_name(rng)} = {names};\n",
+            f"print_int({names});\n",
+        ]
+    )
+
+
+def _operand(rng: random.Random) -> str:
+    return str(rng.randrange(100)) if rng.random() < 0.7 else _name(rng)
+
+
+def _operators(rng: random.Random) -> str:
+    operators = ["+", "-", "*", "/", "%", "<", "<=", ">", ">=", "==", "!="]
+    expression = _operand(rng)
+    for _ in range(rng.randint(3, 12)):
+        if rng.random() < 0.2:
+            expression = f"({expression})"
+        expression += f" {rng.choice(operators)} {_operand(rng)}"
+    if rng.random() < 0.3:
+        expression = f"not {expression} and {_operand(rng)} or {_operand(rng)}"
+    return f"{_name(rng)} = {expression};\n"
+
+
+def _comments(rng: random.Random) -> str:
+    if rng.random() < 0.2:
+        return _identifiers(rng)
+    words = " ".join(rng.choice(["lorem", "ipsum", "x = 1;", "{", "if"]) for _ in range(8))
+    return f"{rng.choice(['#', '//'])} {words}\n"
+
+
+def _nesting(rng: random.Random) -> str:
+    statement = f"{_name(rng)} = {_operand(rng)};"
+    for _ in range(rng.randint(2, 12)):
+        statement = rng.choice(
+            [
+                f"{{ {statement} }}",
+                f"if {_name(rng)} then {{ {statement} }} else {_operand(rng)}",
+                f"while {_name(rng)} do {{ {statement} }}",
+            ]
+        )
+    return statement + ";\n"
+
+
+CORPORA: dict[str, Statement] = {
+    "identifiers": _identifiers,
+    "operators": _operators,
+    "comments": _comments,
+    "nesting": _nesting,
+}
+
+
+def generate(kind: str, size: int, seed: int = 0) -> str:
+    """Generate a program of the given kind, at least `size` characters long (one statement
+    longer at most)."""
+    statement = CORPORA[kind]
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        part = statement(rng)
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
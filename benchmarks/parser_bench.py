@@ -0,0 +1,140 @@
+"""Parser throughput benchmarks over the generated corpora.
+
+Usage: python -m benchmarks.parser_bench [--sizes=1K,100K,1M] [--corpora=NAME,...]
+           [--baseline=FILE] [--save-baseline] [--threshold=0.1]
+
+Every corpus is tokenized once, both into a list of tokens and into a TokenBuffer, and then
+parsed repeatedly. This reports tokens/s and the deepest Python call stack reached while
+parsing. Baselines and regressions work as in benchmarks.tokenizer_bench.
+"""
+
+from collections.abc import Callable, Sequence
+import json
+import os
+import re
+import sys
+import time
+from types import FrameType
+
+from benchmarks.corpus import CORPORA, generate
+from benchmarks.tokenizer_bench import MIN_TIME, parse_size
+from compiler.parser import parse
+from compiler.tokenizer import Token, tokenize, tokenize_to_buffer
+
+INPUTS: dict[str, Callable[[str], Sequence[Token]]] = {
+    "list": tokenize,
+    "buffer": tokenize_to_buffer,
+}
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "parser.json")
+
+
+def call_depth(function: Callable[[], object]) -> int:
+    depth = 0
+    max_depth = 0
+
+    def profile(frame: FrameType, event: str, arg: object) -> None:
+        nonlocal depth, max_depth
+        if event == "call":
+            depth += 1
+            max_depth = max(max_depth, depth)
+        elif event == "return":
+            depth -= 1
+
+    sys.setprofile(profile)
+    try:
+        function()
+    finally:
+        sys.setprofile(None)
+    # the profile is installed from inside this function, so its own return is counted too
+    return max_depth
+
+
+def measure(tokens: Sequence[Token]) -> dict[str, float]:
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        parse(tokens)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_TIME:
+            break
+    seconds = elapsed / runs
+
+    return {
+        "tokens_per_second": len(tokens) / seconds,
+        "max_call_depth": call_depth(lambda: parse(tokens)),
+    }
+
+
+def main() -> int:
+    sizes = ["1K", "100K", "1M"]
+    corpora = list(CORPORA)
+    baseline_file = DEFAULT_BASELINE
+    save_baseline = False
+    threshold = 0.1
+    for arg in sys.argv[1:]:
+        if (m := re.fullmatch(r"--sizes=(.+)", arg)) is not None:
+            sizes = m[1].split(",")
+        elif (m := re.fullmatch(r"--corpora=(.+)", arg)) is not None:
+            corpora = m[1].split(",")
+        elif (m := re.fullmatch(r"--baseline=(.+)", arg)) is not None:
+            baseline_file = m[1]
+        elif arg == "--save-baseline":
+            save_baseline = True
+        elif (m := re.fullmatch(r"--threshold=(.+)", arg)) is not None:
+            threshold = float(m[1])
+        else:
+            print(f"Unknown argument: {arg}", file=sys.stderr)
+            return 1
+
+    baseline: dict[str, dict[str, float]] = {}
+    if not save_baseline and os.path.exists(baseline_file):
+        with open(baseline_file) as f:
+            baseline = json.load(f)
+
+    results: dict[str, dict[str, float]] = {}
+    regressions = []
+    print(f"{'benchmark':<32} {'tokens/s':>12} {'call depth':>11} {'vs baseline':>12}")
+    for corpus in corpora:
+        for size in sizes:
+            source_code = generate(corpus, parse_size(size))
+            for name, tokenize_function in INPUTS.items():
+                key = f"{name}/{corpus}/{size}"
+                result = measure(tokenize_function(source_code))
+                results[key] = result
+
+                change = ""
+                if key in baseline:
+                    ratio = (
+                        result["tokens_per_second"]
+                        / baseline[key]["tokens_per_second"]
+                    )
+                    change = f"{ratio - 1:+.1%}"
+                    if ratio < 1 - threshold:
+                        regressions.append(key)
+                        change += " !"
+                print(
+                    f"{key:<32} {result['tokens_per_second']:>12,.0f}"
+                    f" {result['max_call_depth']:>11,.0f} {change:>12}"
+                )
+
+    if save_baseline:
+        os.makedirs(os.path.dirname(baseline_file), exist_ok=True)
+        with open(baseline_file, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline saved to {baseline_file}")
+
+    if regressions:
+        print(
+            f"{len(regressions)} regression(s) of more than {threshold:.0%}: "
+            + ", ".join(regressions),
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
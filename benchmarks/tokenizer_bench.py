@@ -0,0 +1,140 @@
+"""Tokenizer throughput benchmarks over the generated corpora.
+
+Usage: python -m benchmarks.tokenizer_bench [--sizes=1K,100K,1M,10M] [--corpora=NAME,...]
+           [--baseline=FILE] [--save-baseline] [--threshold=0.1]
+
+For every tokenizer function, corpus and size this reports tokens/s, MB/s and the peak memory
+allocated while tokenizing (measured in a separate run, since tracemalloc slows things down).
+Results are compared against the baseline file: a throughput more than `threshold` below the
+baseline is reported as a regression and makes the exit code 1. --save-baseline writes the
+results to the baseline file instead.
+"""
+
+from collections.abc import Callable
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+from benchmarks.corpus import CORPORA, generate
+from compiler.tokenizer import tokenize, tokenize_to_buffer
+
+FUNCTIONS: dict[str, Callable[[str], object]] = {
+    "tokenize": tokenize,
+    "tokenize_to_buffer": tokenize_to_buffer,
+}
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "tokenizer.json")
+
+# small sources are tokenized repeatedly until this many seconds have passed
+MIN_TIME = 0.2
+
+
+def parse_size(size: str) -> int:
+    m = re.fullmatch(r"(\d+)([KM]?)", size)
+    if m is None:
+        raise Exception(f"Invalid size: {size}")
+    return int(m[1]) * {"": 1, "K": 1024, "M": 1024 * 1024}[m[2]]
+
+
+def measure(function: Callable[[str], object], source_code: str) -> dict[str, float]:
+    token_count = len(tokenize_to_buffer(source_code))
+
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        function(source_code)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_TIME:
+            break
+    seconds = elapsed / runs
+
+    tracemalloc.start()
+    function(source_code)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "tokens_per_second": token_count / seconds,
+        "mb_per_second": len(source_code) / seconds / 1e6,
+        "peak_memory_mb": peak / 1e6,
+    }
+
+
+def main() -> int:
+    sizes = ["1K", "100K", "1M", "10M"]
+    corpora = list(CORPORA)
+    baseline_file = DEFAULT_BASELINE
+    save_baseline = False
+    threshold = 0.1
+    for arg in sys.argv[1:]:
+        if (m := re.fullmatch(r"--sizes=(.+)", arg)) is not None:
+            sizes = m[1].split(",")
+        elif (m := re.fullmatch(r"--corpora=(.+)", arg)) is not None:
+            corpora = m[1].split(",")
+        elif (m := re.fullmatch(r"--baseline=(.+)", arg)) is not None:
+            baseline_file = m[1]
+        elif arg == "--save-baseline":
+            save_baseline = True
+        elif (m := re.fullmatch(r"--threshold=(.+)", arg)) is not None:
+            threshold = float(m[1])
+        else:
+            print(f"Unknown argument: {arg}", file=sys.stderr)
+            return 1
+
+    baseline: dict[str, dict[str, float]] = {}
+    if not save_baseline and os.path.exists(baseline_file):
+        with open(baseline_file) as f:
+            baseline = json.load(f)
+
+    results: dict[str, dict[str, float]] = {}
+    regressions = []
+    print(
+        f"{'benchmark':<40} {'tokens/s':>12} {'MB/s':>8} {'peak MB':>9} {'vs baseline':>12}"
+    )
+    for corpus in corpora:
+        for size in sizes:
+            source_code = generate(corpus, parse_size(size))
+            for name, function in FUNCTIONS.items():
+                key = f"{name}/{corpus}/{size}"
+                result = measure(function, source_code)
+                results[key] = result
+
+                change = ""
+                if key in baseline:
+                    ratio = (
+                        result["tokens_per_second"]
+                        / baseline[key]["tokens_per_second"]
+                    )
+                    change = f"{ratio - 1:+.1%}"
+                    if ratio < 1 - threshold:
+                        regressions.append(key)
+                        change += " !"
+                print(
+                    f"{key:<40} {result['tokens_per_second']:>12,.0f}"
+                    f" {result['mb_per_second']:>8.2f} {result['peak_memory_mb']:>9.2f}"
+                    f" {change:>12}"
+                )
+
+    if save_baseline:
+        os.makedirs(os.path.dirname(baseline_file), exist_ok=True)
+        with open(baseline_file, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline saved to {baseline_file}")
+
+    if regressions:
+        print(
+            f"{len(regressions)} regression(s) of more than {threshold:.0%}: "
+            + ", ".join(regressions),
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
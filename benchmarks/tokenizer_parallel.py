@@ -0,0 +1,118 @@
+"""Find the source size from which tokenize_parallel beats tokenize_to_buffer.
+
+Usage: python -m benchmarks.tokenizer_parallel [--workers=N] [--max-mb=N] [--save-baseline]
+
+Serial and parallel times are measured at doubling sizes and fitted to a cost model. Serial
+tokenization costs `serial` seconds per MB. Parallel tokenization costs `startup` seconds for
+starting the process pool, `transfer` seconds per MB for sending the chunks and token arrays
+between processes, and the serial cost divided between the workers. The model predicts the
+crossover size for 2, 4 and 8 workers with a core each, even on a machine with fewer cores.
+--save-baseline writes the measurements and predictions to baselines/tokenizer_parallel.json,
+from which the tokenizer's PARALLEL_THRESHOLD is derived.
+"""
+
+from collections.abc import Callable
+import json
+import os
+import re
+import sys
+import time
+
+from benchmarks.corpus import generate
+from compiler.tokenizer import tokenize_parallel, tokenize_to_buffer
+
+
+def best_time(function: Callable[..., object], *args: object, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "tokenizer_parallel.json")
+
+
+def main() -> int:
+    # with one worker tokenize_parallel would just call tokenize_to_buffer
+    workers = max(os.cpu_count() or 1, 2)
+    max_mb = 64
+    save_baseline = False
+    for arg in sys.argv[1:]:
+        if (m := re.fullmatch(r"--workers=(\d+)", arg)) is not None:
+            workers = int(m[1])
+        elif (m := re.fullmatch(r"--max-mb=(\d+)", arg)) is not None:
+            max_mb = int(m[1])
+        elif arg == "--save-baseline":
+            save_baseline = True
+        else:
+            print(f"Unknown argument: {arg}", file=sys.stderr)
+            return 1
+
+    cores = min(workers, os.cpu_count() or 1)
+    print(f"{os.cpu_count()} CPUs, {workers} workers")
+    print(f"{'size':>8} {'serial':>9} {'parallel':>9} {'speedup':>8}")
+    sizes: list[float] = []
+    serial_times: list[float] = []
+    parallel_times: list[float] = []
+    size_kb = 256
+    while size_kb <= max_mb * 1024:
+        source_code = generate("operators", size_kb * 1024)
+        serial = best_time(tokenize_to_buffer, source_code)
+        parallel = best_time(tokenize_parallel, source_code, workers, 0)
+        print(
+            f"{size_kb / 1024:>6.2f}MB {serial:>8.2f}s {parallel:>8.2f}s"
+            f" {serial / parallel:>7.2f}x"
+        )
+        sizes.append(size_kb / 1024)
+        serial_times.append(serial)
+        parallel_times.append(parallel)
+        size_kb *= 2
+
+    # a source of one line per worker measures starting and stopping the pool
+    startup = best_time(tokenize_parallel, "a\n" * workers, workers, 0)
+    serial_per_mb = sum(serial_times) / sum(sizes)
+    parallel_per_mb = (sum(parallel_times) - startup * len(sizes)) / sum(sizes)
+    transfer_per_mb = parallel_per_mb - serial_per_mb / cores
+    print(
+        f"model: serial {serial_per_mb:.3f}s/MB, startup {startup:.3f}s,"
+        f" transfer {transfer_per_mb:.3f}s/MB"
+    )
+
+    # parallel is faster once startup + n * (transfer + serial / k) < n * serial
+    crossover_mb: dict[str, float | None] = {}
+    for k in (2, 4, 8):
+        saving_per_mb = serial_per_mb * (1 - 1 / k) - transfer_per_mb
+        crossover = startup / saving_per_mb if saving_per_mb > 0 else None
+        crossover_mb[str(k)] = crossover
+        if crossover is None:
+            print(f"{k} workers: parallel tokenization is never faster")
+        else:
+            print(f"{k} workers: parallel tokenization is faster from about {crossover:.2f}MB")
+
+    if save_baseline:
+        os.makedirs(os.path.dirname(BASELINE), exist_ok=True)
+        with open(BASELINE, "w") as f:
+            json.dump(
+                {
+                    "cpus": os.cpu_count(),
+                    "workers": workers,
+                    "sizes_mb": sizes,
+                    "serial_seconds": serial_times,
+                    "parallel_seconds": parallel_times,
+                    "serial_seconds_per_mb": serial_per_mb,
+                    "startup_seconds": startup,
+                    "transfer_seconds_per_mb": transfer_per_mb,
+                    "crossover_mb": crossover_mb,
+                },
+                f,
+                indent=2,
+            )
+            f.write("\n")
+        print(f"Baseline saved to {BASELINE}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Visitor dispatch benchmarks.
+
+Usage: python -m benchmarks.visitor_bench [--sizes=100K,1M]
+
+Counts the nodes of each class in the AST of a program from benchmarks.ast_bench, once with a
+recursive function that dispatches with a `match` statement and once with an ast.Visitor, so
+the difference is the cost of dispatching. It also reports the time to type check and
+interpret the same AST.
+"""
+
+from collections import Counter
+from collections.abc import Callable
+import re
+import sys
+
+from benchmarks.ast_bench import declarations, seconds
+from benchmarks.tokenizer_bench import parse_size
+import compiler.ast as ast
+from compiler.interpreter import interpret
+from compiler.parser import parse
+from compiler.tokenizer import tokenize_to_buffer
+from compiler.type_checker import typecheck
+
+
+def count_with_match(node: ast.Expression, counts: Counter[str]) -> None:
+    match node:
+        case ast.Literal():
+            counts["Literal"] += 1
+        case ast.Identifier():
+            counts["Identifier"] += 1
+        case ast.BinaryOp():
+            counts["BinaryOp"] += 1
+            count_with_match(node.left, counts)
+            count_with_match(node.right, counts)
+        case ast.UnaryOp():
+            counts["UnaryOp"] += 1
+            count_with_match(node.right, counts)
+        case ast.Conditional():
+            counts["Conditional"] += 1
+            count_with_match(node.cond_if, counts)
+            count_with_match(node.then, counts)
+            if node.cond_else is not None:
+                count_with_match(node.cond_else, counts)
+        case ast.FunctionCall():
+            counts["FunctionCall"] += 1
+            for argument in node.arguments:
+                count_with_match(argument, counts)
+        case ast.Block():
+            counts["Block"] += 1
+            for statement in node.statements:
+                count_with_match(statement, counts)
+            if node.result is not None and node.result is not ast.NO_RESULT:
+                count_with_match(node.result, counts)
+        case ast.VariableDeclaration():
+            counts["VariableDeclaration"] += 1
+            count_with_match(node.initializer, counts)
+        case ast.While():
+            counts["While"] += 1
+            count_with_match(node.cond, counts)
+            count_with_match(node.body, counts)
+
+
+class Counts(ast.Visitor[None]):
+    def __init__(self) -> None:
+        self.counts: Counter[str] = Counter()
+
+    def visit_Literal(self, node: ast.Literal) -> None:
+        self.counts["Literal"] += 1
+
+    def visit_Identifier(self, node: ast.Identifier) -> None:
+        self.counts["Identifier"] += 1
+
+    def visit_BinaryOp(self, node: ast.BinaryOp) -> None:
+        self.counts["BinaryOp"] += 1
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> None:
+        self.counts["UnaryOp"] += 1
+        self.visit(node.right)
+
+    def visit_Conditional(self, node: ast.Conditional) -> None:
+        self.counts["Conditional"] += 1
+        self.visit(node.cond_if)
+        self.visit(node.then)
+        if node.cond_else is not None:
+            self.visit(node.cond_else)
+
+    def visit_FunctionCall(self, node: ast.FunctionCall) -> None:
+        self.counts["FunctionCall"] += 1
+        for argument in node.arguments:
+            self.visit(argument)
+
+    def visit_Block(self, node: ast.Block) -> None:
+        self.counts["Block"] += 1
+        for statement in node.statements:
+            self.visit(statement)
+        if node.result is not None and node.result is not ast.NO_RESULT:
+            self.visit(node.result)
+
+    def visit_VariableDeclaration(self, node: ast.VariableDeclaration) -> None:
+        self.counts["VariableDeclaration"] += 1
+        self.visit(node.initializer)
+
+    def visit_While(self, node: ast.While) -> None:
+        self.counts["While"] += 1
+        self.visit(node.cond)
+        self.visit(node.body)
+
+
+def count_with_visitor(node: ast.Expression) -> Counter[str]:
+    visitor = Counts()
+    visitor.visit(node)
+    return visitor.counts
+
+
+def main() -> int:
+    sizes = ["100K", "1M"]
+    for arg in sys.argv[1:]:
+        if (m := re.fullmatch(r"--sizes=(.+)", arg)) is not None:
+            sizes = m[1].split(",")
+        else:
+            print(f"Unknown argument: {arg}", file=sys.stderr)
+            return 1
+
+    print(f"{'benchmark':<24} {'match':>12} {'visitor':>12} {'speedup':>8}")
+    for size in sizes:
+        tree = parse(tokenize_to_buffer(declarations(parse_size(size))))
+        counts: Counter[str] = Counter()
+        count_with_match(tree, counts)
+        assert count_with_visitor(tree) == counts
+
+        match_seconds = seconds(lambda: count_with_match(tree, Counter()))
+        visitor_seconds = seconds(lambda: count_with_visitor(tree))
+        print(f"{size} ({counts.total():,} nodes)")
+        print(
+            f"  {'dispatch':<22} {match_seconds * 1000:>10.1f}ms"
+            f" {visitor_seconds * 1000:>10.1f}ms {match_seconds / visitor_seconds:>7.2f}x"
+        )
+        passes: list[tuple[str, Callable[[ast.Expression], object]]] = [
+            ("typecheck", typecheck),
+            ("interpret", interpret),
+        ]
+        for name, function in passes:
+            print(f"  {name:<22} {'':>12} {seconds(lambda: function(tree)) * 1000:>10.1f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
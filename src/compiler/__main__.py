@@ -6,10 +6,29 @@ from socketserver import ForkingTCPServer, StreamRequestHandler
 from traceback import format_exception
 from typing import Any
 
+import compiler.ast as ast
+from compiler.cache import DEFAULT_MAX_SIZE, CompilationCache
+from compiler.parser import ParseError
+from compiler.pipeline import Pipeline, compiler_pipeline
+from compiler.tokenizer import TokenBuffer
 
-def call_compiler(source_code: str, input_file_name: str) -> bytes:
+
+# the passes are in compiler.pipeline
+def call_compiler(
+    source_code: str | bytes | TokenBuffer,
+    input_file_name: str,
+    pipeline: Pipeline | None = None,
+) -> bytes:
+    if pipeline is None:
+        pipeline = compiler_pipeline()
+    tree = pipeline.run(source_code)
+    return generate_code(tree, input_file_name)
+
+
+# the stage after the pipeline, from the checked and optimized AST to an executable
+def generate_code(tree: ast.Expression, input_file_name: str) -> bytes:
     # *** TODO ***
-    # Call your compiler here and return the compiled executable.
+    # Generate code here and return the compiled executable.
     # Raise an exception on compilation error.
     # *** TODO ***
     raise NotImplementedError("Compiler not implemented")
@@ -22,9 +41,24 @@ def main() -> int:
     output_file: str | None = None
     host = "127.0.0.1"
     port = 3000
+    cache_dir: str | None = None
+    cache_size = DEFAULT_MAX_SIZE
+    constant_folding = True
+    dead_code_elimination = True
+    time_passes = False
     for arg in sys.argv[1:]:
         if (m := re.fullmatch(r'--output=(.+)', arg)) is not None:
             output_file = m[1]
+        elif (m := re.fullmatch(r'--cache-dir=(.+)', arg)) is not None:
+            cache_dir = m[1]
+        elif (m := re.fullmatch(r'--cache-size=(.+)', arg)) is not None:
+            cache_size = int(m[1])
+        elif arg == '--no-fold-constants':
+            constant_folding = False
+        elif arg == '--no-eliminate-dead-code':
+            dead_code_elimination = False
+        elif arg == '--time-passes':
+            time_passes = True
         elif (m := re.fullmatch(r'--host=(.+)', arg)) is not None:
             host = m[1]
         elif (m := re.fullmatch(r'--port=(.+)', arg)) is not None:
@@ -42,25 +76,36 @@ def main() -> int:
         print(f"Error: command argument missing", file=sys.stderr)
         return 1
 
-    def read_source_code() -> str:
-        if input_file is not None:
-            with open(input_file) as f:
-                return f.read()
-        else:
-            return sys.stdin.read()
+    # tokens and ASTs of source code that was compiled before are read from the cache
+    cache = CompilationCache(cache_dir, cache_size) if cache_dir is not None else None
+    # --time-passes reports the time and memory of each pass, the latter measured with
+    # tracemalloc, which slows compiling down
+    pipeline = compiler_pipeline(
+        cache,
+        constant_folding,
+        dead_code_elimination,
+        time_passes,
+        # an input file is read by the first pass, so that --time-passes includes it
+        read_file=command == 'compile' and input_file is not None,
+    )
 
     # === Command implementations ===
 
     if command == 'compile':
-        source_code = read_source_code()
+        # the path of the input file, or the source code from stdin
+        source_code = input_file if input_file is not None else sys.stdin.read()
         if output_file is None:
             raise Exception("Output file flag --output=... required")
-        executable = call_compiler(source_code, input_file or '(source code)')
+        try:
+            executable = call_compiler(source_code, input_file or '(source code)', pipeline)
+        finally:
+            if time_passes:
+                print(pipeline.report(), file=sys.stderr)
         with open(output_file, 'wb') as f:
             f.write(executable)
     elif command == 'serve':
         try:
-            run_server(host, port)
+            run_server(host, port, cache, pipeline, time_passes)
         except KeyboardInterrupt:
             pass
     else:
@@ -69,7 +114,15 @@ def main() -> int:
     return 0
 
 
-def run_server(host: str, port: int) -> None:
+def run_server(
+    host: str,
+    port: int,
+    cache: CompilationCache | None = None,
+    pipeline: Pipeline | None = None,
+    time_passes: bool = False,
+) -> None:
+    passes = pipeline if pipeline is not None else compiler_pipeline(cache)
+
     class Server(ForkingTCPServer):
         allow_reuse_address = True
         request_queue_size = 32
@@ -78,11 +131,12 @@ def run_server(host: str, port: int) -> None:
         def handle(self) -> None:
             result: dict[str, Any] = {}
             try:
-                input_str = self.rfile.read().decode()
-                input = json.loads(input_str)
+                # json.loads decodes the UTF-8 request itself, so the request isn't
+                # decoded into an intermediate str first
+                input = json.loads(self.rfile.read())
                 if input["command"] == "compile":
                     source_code = input["code"]
-                    executable = call_compiler(source_code, "(source code)")
+                    executable = call_compiler(source_code, "(source code)", passes)
                     result["program"] = b64encode(executable).decode()
                 elif input["command"] == "ping":
                     pass
@@ -90,8 +144,14 @@ def run_server(host: str, port: int) -> None:
                     result["error"] = "Unknown command: " + input['command']
             except Exception as e:
                 result["error"] = "".join(format_exception(e))
-            result_str = json.dumps(result)
-            self.request.sendall(str.encode(result_str))
+                if isinstance(e, ParseError):
+                    result["errors"] = e.diagnostics
+            # each request is handled in a forked process, so these are the request's own
+            if cache is not None:
+                result["cache"] = cache.stats()
+            if time_passes and passes.stats:
+                result["passes"] = passes.stats_json()
+            self.request.sendall(json.dumps(result).encode())
 
     print(f"Starting TCP server at {host}:{port}")
     with Server((host, port), Handler) as server:
@@ -1,69 +1,697 @@
-from dataclasses import dataclass, field
+from array import array
+from collections.abc import Callable
+from dataclasses import dataclass, field, fields
+from typing import Any, cast
+from compiler.symbols import NO_SYMBOL, SYMBOLS
 from compiler.tokenizer import Location
 from compiler.types import Type
 
 
-@dataclass
+# Nodes with a name or an operator also store its ID in compiler.symbols.SYMBOLS as `symbol`,
+# which the type checker and interpreter use for comparisons and symbol table lookups. The
+# parser passes it from the token; otherwise it's looked up from the name. The name (or
+# operator) is replaced with the table's copy of it, so there's only one string per name.
+def _intern(node: "Identifier | FunctionCall | VariableDeclaration") -> None:
+    if node.symbol == NO_SYMBOL:
+        node.symbol = SYMBOLS.intern(node.name)
+    node.name = SYMBOLS.name(node.symbol)
+
+
+# Nodes have __slots__ instead of a __dict__, since programs can have millions of them
+@dataclass(slots=True)
 class Expression:
     """Base class for AST nodes representing expressions."""
 
     location: Location
 
 
-@dataclass
+@dataclass(slots=True)
 class Literal(Expression):
     value: int | bool
 
 
-@dataclass
+@dataclass(slots=True)
 class Identifier(Expression):
     name: str
+    symbol: int = field(default=NO_SYMBOL, compare=False, repr=False)
 
+    def __post_init__(self) -> None:
+        _intern(self)
 
-@dataclass
+
+@dataclass(slots=True)
 class BinaryOp(Expression):
     """AST node for a binary operation like `A + B`"""
 
     left: Expression
     op: str
     right: Expression
+    symbol: int = field(default=NO_SYMBOL, compare=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.symbol == NO_SYMBOL:
+            self.symbol = SYMBOLS.intern(self.op)
+        self.op = SYMBOLS.name(self.symbol)
 
 
-@dataclass
+@dataclass(slots=True)
 class UnaryOp(Expression):
     op: str
     right: Expression
+    symbol: int = field(default=NO_SYMBOL, compare=False, repr=False)
 
+    def __post_init__(self) -> None:
+        if self.symbol == NO_SYMBOL:
+            self.symbol = SYMBOLS.intern(self.op)
+        self.op = SYMBOLS.name(self.symbol)
 
-@dataclass
+
+@dataclass(slots=True)
 class Conditional(Expression):
     cond_if: Expression
     then: Expression
     cond_else: Expression | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class FunctionCall(Expression):
     name: str
     arguments: list[Expression]
+    symbol: int = field(default=NO_SYMBOL, compare=False, repr=False)
+
+    def __post_init__(self) -> None:
+        _intern(self)
+
+
+class _NoResult(Literal):
+    """Type of NO_RESULT. It compares equal to any Literal with the same (None) fields."""
+
+    __slots__ = ()
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("NO_RESULT can't be modified")
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Literal):
+            return NotImplemented
+        return (other.location, other.value) == (None, None)
+
+    __hash__ = object.__hash__
+
+    def __repr__(self) -> str:
+        return "NO_RESULT"
 
+    # pickled and copied as a reference to the one instance
+    def __reduce__(self) -> str:
+        return "NO_RESULT"
 
-@dataclass
+
+# the result of a Block that ends in ";", shared by all of them
+NO_RESULT: Literal = object.__new__(_NoResult)
+object.__setattr__(NO_RESULT, "location", None)
+object.__setattr__(NO_RESULT, "value", None)
+
+
+@dataclass(slots=True)
 class Block(Expression):
     statements: list[Expression]
-    result: Expression | Literal = field(
-        default_factory=lambda: Literal(location=None, value=None)
-    )
+    result: Expression | Literal = NO_RESULT
 
 
-@dataclass
+@dataclass(slots=True)
 class VariableDeclaration(Expression):
     name: str
     initializer: Expression
     declared_type: Type = None
+    symbol: int = field(default=NO_SYMBOL, compare=False, repr=False)
+
+    def __post_init__(self) -> None:
+        _intern(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class While(Expression):
     cond: Expression
     body: Expression
+
+
+_CHILD_FIELDS: dict[type[Expression], tuple[str, ...]] = {}
+
+
+def child_fields(node_type: type[Expression]) -> tuple[str, ...]:
+    """The names of the fields of a node class that hold a child node or a list of them."""
+    names = _CHILD_FIELDS.get(node_type)
+    if names is None:
+        names = _CHILD_FIELDS[node_type] = tuple(
+            f.name
+            for f in fields(node_type)
+            if f.name not in ("location", "symbol", "name", "op", "value", "declared_type")
+        )
+    return names
+
+
+# node classes in the order of their kind codes in an Arena
+NODE_TYPES: tuple[type[Expression], ...] = (
+    Literal,
+    Identifier,
+    BinaryOp,
+    UnaryOp,
+    Conditional,
+    FunctionCall,
+    Block,
+    VariableDeclaration,
+    While,
+)
+_KIND_CODES = {node_type: code for code, node_type in enumerate(NODE_TYPES)}
+_SYMBOL_KINDS = frozenset(
+    _KIND_CODES[node_type]
+    for node_type in (Identifier, BinaryOp, UnaryOp, FunctionCall, VariableDeclaration)
+)
+
+# handle of a missing node
+NO_NODE = -1
+
+# operand of a Block: how its result is stored
+_NO_RESULT_OPERAND = 0
+_RESULT_OPERAND = 1  # the last child
+_NONE_RESULT_OPERAND = 2  # result=None, from an empty block
+
+
+class Arena:
+    """AST nodes stored column-wise in parallel arrays, like TokenBuffer stores tokens.
+
+    A node is an integer handle, the index of its row. Its children are a contiguous range of
+    the `children` array, starting at `child_starts[handle]`, in field order:
+
+        Literal              no children, operand is the index of its value in `values`
+        Identifier           no children, operand is the symbol
+        BinaryOp             left, right; operand is the symbol of the operator
+        UnaryOp              right; operand is the symbol of the operator
+        Conditional          cond_if, then and cond_else if there is one
+        FunctionCall         the arguments; operand is the symbol
+        Block                the statements and the result, see _RESULT_OPERAND
+        VariableDeclaration  initializer; operand is the symbol, the type is in declared_types
+        While                cond, body
+
+    Arena.add numbers the nodes of a tree in preorder, so every subtree is a range of handles.
+    Nodes without a location have -1 as their line and column. Names are not stored, they're
+    the names of the symbols. When pickled, the symbols are mapped to the IDs of the loading
+    process.
+
+    Arena.view gives a node object that reads its fields from the arena, so code written for
+    node objects, like typecheck and interpret, also runs on an arena.
+    """
+
+    def __init__(self) -> None:
+        self.kinds = array("B")
+        self.lines = array("i")
+        self.columns = array("i")
+        self.operands = array("i")
+        self.child_starts = array("i")
+        self.child_counts = array("i")
+        self.children = array("i")
+        self.values: list[int | bool | None] = []
+        self.declared_types: dict[int, Type] = {}
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def kind(self, node: int) -> type[Expression]:
+        return NODE_TYPES[self.kinds[node]]
+
+    def location(self, node: int) -> Location | None:
+        if self.lines[node] < 0:
+            return None
+        return Location(self.columns[node], self.lines[node])
+
+    def child(self, node: int, index: int) -> int:
+        return self.children[self.child_starts[node] + index]
+
+    def child_list(self, node: int) -> list[int]:
+        start = self.child_starts[node]
+        return self.children[start : start + self.child_counts[node]].tolist()
+
+    def value(self, node: int) -> int | bool | None:
+        return self.values[self.operands[node]]
+
+    def name(self, node: int) -> str:
+        return SYMBOLS.name(self.operands[node])
+
+    def statements(self, node: int) -> list[int]:
+        """The statements of a Block."""
+        statements = self.child_list(node)
+        if self.operands[node] == _RESULT_OPERAND:
+            statements.pop()
+        return statements
+
+    def result(self, node: int) -> int:
+        """The result of a Block, NO_NODE if it has none."""
+        if self.operands[node] != _RESULT_OPERAND:
+            return NO_NODE
+        return self.children[self.child_starts[node] + self.child_counts[node] - 1]
+
+    def subtree_end(self, node: int) -> int:
+        """The handle after the last node of a subtree. Nodes are added in preorder, so the
+        subtree of `node` is the handles from `node` up to this."""
+        while self.child_counts[node] > 0:
+            node = self.children[self.child_starts[node] + self.child_counts[node] - 1]
+        return node + 1
+
+    def walk(self, node: int) -> range:
+        """The handles of a subtree in preorder."""
+        return range(node, self.subtree_end(node))
+
+    def view(self, node: int) -> Expression:
+        """A read-only node object that stands for `node`. It's an instance of a subclass of
+        the node's class whose fields read the arena, and its children are views too."""
+        view = object.__new__(_VIEW_TYPES[self.kinds[node]])
+        # the slots are declared by the view class, which mypy doesn't know
+        object.__setattr__(view, "_arena", self)
+        object.__setattr__(view, "_handle", node)
+        return view
+
+    def add(self, tree: Expression) -> int:
+        """Copy a tree of node objects into the arena and return the handle of its root."""
+        root = len(self.kinds)
+        # nodes with the index of the slot in `children` that gets their handle
+        stack: list[tuple[Expression, int]] = [(tree, NO_NODE)]
+        while stack:
+            node, slot = stack.pop()
+            handle = len(self.kinds)
+            if slot != NO_NODE:
+                self.children[slot] = handle
+
+            kind = _KIND_CODES.get(type(node))
+            if kind is None:
+                # subclasses, like the lazy blocks of the parser
+                kind = next((_KIND_CODES[t] for t in type(node).__mro__ if t in _KIND_CODES), None)
+                if kind is None:
+                    raise TypeError(f"not an AST node: {node!r}")
+            self.kinds.append(kind)
+            location = node.location
+            if location is None:
+                self.lines.append(-1)
+                self.columns.append(-1)
+            else:
+                self.lines.append(location.line)
+                self.columns.append(location.column)
+
+            operand = 0
+            children: list[Expression]
+            match node:
+                case Literal():
+                    operand = len(self.values)
+                    self.values.append(node.value)
+                    children = []
+                case Identifier():
+                    operand = node.symbol
+                    children = []
+                case BinaryOp():
+                    operand = node.symbol
+                    children = [node.left, node.right]
+                case UnaryOp():
+                    operand = node.symbol
+                    children = [node.right]
+                case Conditional():
+                    children = [node.cond_if, node.then]
+                    if node.cond_else is not None:
+                        children.append(node.cond_else)
+                case FunctionCall():
+                    operand = node.symbol
+                    children = node.arguments
+                case Block():
+                    children = node.statements
+                    if node.result is NO_RESULT:
+                        operand = _NO_RESULT_OPERAND
+                    elif node.result is None:
+                        operand = _NONE_RESULT_OPERAND
+                    else:
+                        operand = _RESULT_OPERAND
+                        children = children + [node.result]
+                case VariableDeclaration():
+                    operand = node.symbol
+                    children = [node.initializer]
+                    if node.declared_type is not None:
+                        self.declared_types[handle] = node.declared_type
+                case While():
+                    children = [node.cond, node.body]
+
+            self.operands.append(operand)
+            start = len(self.children)
+            self.child_starts.append(start)
+            self.child_counts.append(len(children))
+            self.children.extend([NO_NODE] * len(children))
+            # reversed, so that nodes are numbered in preorder
+            for i in range(len(children) - 1, -1, -1):
+                stack.append((children[i], start + i))
+        return root
+
+    def tree(self, node: int) -> Expression:
+        """Build the tree of node objects of a subtree."""
+        built: dict[int, Expression] = {}
+        # every node is visited twice, the second time after its children are built
+        stack = [(node, False)]
+        while stack:
+            handle, children_built = stack.pop()
+            if not children_built:
+                stack.append((handle, True))
+                stack.extend((child, False) for child in self.child_list(handle))
+                continue
+
+            children = [built.pop(child) for child in self.child_list(handle)]
+            # None for nodes without a location, like Literal(location=None, ...) elsewhere
+            location = cast(Location, self.location(handle))
+            kind = self.kind(handle)
+            operand = self.operands[handle]
+            tree: Expression
+            if kind is Literal:
+                tree = Literal(location, self.values[operand])  # type: ignore[arg-type]
+            elif kind is Identifier:
+                tree = Identifier(location, SYMBOLS.name(operand), operand)
+            elif kind is BinaryOp:
+                op = SYMBOLS.name(operand)
+                tree = BinaryOp(location, children[0], op, children[1], operand)
+            elif kind is UnaryOp:
+                tree = UnaryOp(location, SYMBOLS.name(operand), children[0], operand)
+            elif kind is Conditional:
+                tree = Conditional(location, *children)
+            elif kind is FunctionCall:
+                tree = FunctionCall(location, SYMBOLS.name(operand), children, operand)
+            elif kind is Block:
+                if operand == _RESULT_OPERAND:
+                    tree = Block(location, children[:-1], children[-1])
+                elif operand == _NONE_RESULT_OPERAND:
+                    tree = Block(location, children, None)  # type: ignore[arg-type]
+                else:
+                    tree = Block(location, children)
+            elif kind is VariableDeclaration:
+                declared_type = self.declared_types.get(handle)
+                name = SYMBOLS.name(operand)
+                tree = VariableDeclaration(
+                    location, name, children[0], declared_type, operand  # type: ignore[arg-type]
+                )
+            else:
+                tree = While(location, *children)
+            built[handle] = tree
+        return built[node]
+
+    # Symbol IDs depend on the order in which a process interned its names, so they're
+    # pickled with the names and mapped to the IDs of the loading process.
+    def __getstate__(self) -> dict[str, object]:
+        state = dict(self.__dict__)
+        state["names"] = {
+            symbol: SYMBOLS.name(symbol)
+            for kind, symbol in zip(self.kinds, self.operands)
+            if kind in _SYMBOL_KINDS
+        }
+        return state
+
+    def __setstate__(self, state: dict[str, object]) -> None:
+        names = cast(dict[int, str], state.pop("names"))
+        self.__dict__.update(state)
+        symbol_ids = {symbol: SYMBOLS.intern(name) for symbol, name in names.items()}
+        if any(symbol != new_symbol for symbol, new_symbol in symbol_ids.items()):
+            for node, kind in enumerate(self.kinds):
+                if kind in _SYMBOL_KINDS:
+                    self.operands[node] = symbol_ids[self.operands[node]]
+
+
+# reads a field of the node object that a handle stands for, see Arena.view
+type _FieldReader = Callable[[Arena, int], object]
+
+
+def _block_result(arena: Arena, node: int) -> object:
+    operand = arena.operands[node]
+    if operand == _NO_RESULT_OPERAND:
+        return NO_RESULT
+    elif operand == _NONE_RESULT_OPERAND:
+        return None
+    return arena.view(arena.result(node))
+
+
+def _child_reader(index: int) -> _FieldReader:
+    def read(arena: Arena, node: int) -> object:
+        # cond_else of a Conditional without an else branch is the only missing child
+        if index >= arena.child_counts[node]:
+            return None
+        return arena.view(arena.children[arena.child_starts[node] + index])
+
+    return read
+
+
+_SHARED_READERS: dict[str, _FieldReader] = {
+    "location": Arena.location,
+    "value": lambda arena, node: arena.values[arena.operands[node]],
+    "symbol": lambda arena, node: arena.operands[node],
+    "name": Arena.name,
+    "op": Arena.name,
+    "declared_type": lambda arena, node: arena.declared_types.get(node),
+    "arguments": lambda arena, node: [arena.view(child) for child in arena.child_list(node)],
+    "statements": lambda arena, node: [arena.view(child) for child in arena.statements(node)],
+    "result": _block_result,
+}
+
+
+def _field_readers(node_type: type[Expression]) -> dict[str, _FieldReader]:
+    readers = {
+        f.name: _SHARED_READERS[f.name] for f in fields(node_type) if f.name in _SHARED_READERS
+    }
+    for index, name in enumerate(child_fields(node_type)):
+        readers.setdefault(name, _child_reader(index))
+    return readers
+
+
+def _field_property(read: _FieldReader) -> property:
+    def get(view: Any) -> object:
+        return read(view._arena, view._handle)
+
+    return property(get)
+
+
+def _view_type(node_type: type[Expression]) -> type[Expression]:
+    # each field is a property, which takes the place of the slot of the node class
+    namespace: dict[str, object] = {"__slots__": ("_arena", "_handle")}
+    for name, read in _field_readers(node_type).items():
+        namespace[name] = _field_property(read)
+    return type(f"{node_type.__name__}View", (node_type,), namespace)
+
+
+# view classes in the order of NODE_TYPES
+_VIEW_TYPES = tuple(_view_type(node_type) for node_type in NODE_TYPES)
+
+
+class HashCons:
+    """Shares structurally identical subtrees, so that each distinct subtree is one object.
+
+    share() returns the shared version of a tree. Subtrees are identical when they have the
+    same node types, values, symbols and declared types, regardless of their locations. The
+    shared node of a subtree is the one that was seen first, and keeps that location; the
+    locations of all of its occurrences are kept in the table, see locations().
+
+    Every shared node also has a structural hash, which is equal for identical subtrees in
+    the same process. Passes can use it as a memoization key together with the node itself:
+    identical subtrees are the same object, so `node is other` is an exact equality check.
+
+    Shared nodes are referenced from many places, so they must not be modified. share()
+    replaces the children of the nodes of its argument with their shared versions.
+    """
+
+    def __init__(self) -> None:
+        # the shared nodes by their type, fields and the hashes of their children
+        self._nodes: dict[tuple, Expression] = {}
+        # the structural hashes by the IDs of the shared nodes. The nodes are kept alive by
+        # _nodes (or _unshared), so their IDs aren't reused by other objects.
+        self._hashes: dict[int, int] = {}
+        # the locations of the occurrences after the first one
+        self._locations: dict[int, list[Location]] = {}
+        # nodes whose key collides with a different subtree, which aren't shared
+        self._unshared: list[Expression] = []
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def share(self, tree: Expression) -> Expression:
+        """Return the shared version of `tree`, adding its new subtrees to the table."""
+        # preorder with the children from right to left, so that reversed it's the postorder
+        # with the children from left to right, and occurrences are seen in source order
+        nodes = []
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if node is None or node is NO_RESULT or id(node) in self._hashes:
+                continue
+            nodes.append(node)
+            stack += _children(node)
+
+        shared: dict[int, Expression] = {}
+        for node in reversed(nodes):
+            shared[id(node)] = self._share_node(node, shared)
+        return shared.get(id(tree), tree)
+
+    def hash(self, node: Expression) -> int:
+        """The structural hash of a shared node."""
+        return self._hashes[id(node)]
+
+    def locations(self, node: Expression) -> list[Location]:
+        """The locations of the occurrences of a shared node, in source order. When walking a
+        tree from share() in preorder, the k-th visit of a node is its k-th occurrence."""
+        return [node.location, *self._locations.get(id(node), ())]
+
+    # the children of `node` are already shared, `shared` maps them from the originals
+    def _share_node(self, node: Expression, shared: dict[int, Expression]) -> Expression:
+        fields: tuple
+        match node:
+            case Literal():
+                # True == 1, but they're different literals
+                fields = (type(node.value), node.value)
+            case Identifier():
+                fields = (node.symbol,)
+            case BinaryOp():
+                node.left = shared.get(id(node.left), node.left)
+                node.right = shared.get(id(node.right), node.right)
+                fields = (node.symbol,)
+            case UnaryOp():
+                node.right = shared.get(id(node.right), node.right)
+                fields = (node.symbol,)
+            case Conditional():
+                node.cond_if = shared.get(id(node.cond_if), node.cond_if)
+                node.then = shared.get(id(node.then), node.then)
+                if node.cond_else is not None:
+                    node.cond_else = shared.get(id(node.cond_else), node.cond_else)
+                fields = (node.cond_else is None,)
+            case FunctionCall():
+                node.arguments = [shared.get(id(arg), arg) for arg in node.arguments]
+                fields = (node.symbol, len(node.arguments))
+            case Block():
+                node.statements = [shared.get(id(stmt), stmt) for stmt in node.statements]
+                node.result = shared.get(id(node.result), node.result)
+                fields = (len(node.statements), node.result is None, node.result is NO_RESULT)
+            case VariableDeclaration():
+                node.initializer = shared.get(id(node.initializer), node.initializer)
+                fields = (node.symbol, node.declared_type)
+            case While():
+                node.cond = shared.get(id(node.cond), node.cond)
+                node.body = shared.get(id(node.body), node.body)
+                fields = ()
+
+        # The hashes of the children are already in _hashes, while IDs would be new ints. Equal
+        # keys with different children are possible, but not likely.
+        hashes = self._hashes
+        children = _children(node)
+        key = (type(node), *fields, *(hashes.get(id(child), 0) for child in children))
+        existing = self._nodes.get(key)
+        if existing is None:
+            self._nodes[key] = node
+        elif all(a is b for a, b in zip(_children(existing), children)):
+            self._locations.setdefault(id(existing), []).append(node.location)
+            return existing
+        else:
+            self._unshared.append(node)
+        hashes[id(node)] = hash(key)
+        return node
+
+
+# the child nodes in field order, including a None cond_else and the result of a Block
+def _children(node: Expression) -> tuple:
+    match node:
+        case Literal() | Identifier():
+            return ()
+        case BinaryOp():
+            return (node.left, node.right)
+        case UnaryOp():
+            return (node.right,)
+        case Conditional():
+            return (node.cond_if, node.then, node.cond_else)
+        case FunctionCall():
+            return tuple(node.arguments)
+        case Block():
+            return (*node.statements, node.result)
+        case VariableDeclaration():
+            return (node.initializer,)
+        case While():
+            return (node.cond, node.body)
+    raise TypeError(f"not an AST node: {node!r}")
+
+
+class _Dispatch(dict[type, Callable[..., Any]]):
+    """The visit methods of a Visitor class by node class."""
+
+    def __init__(self, visitor: "type[Visitor]") -> None:
+        super().__init__()
+        self.visitor = visitor
+        for node_type in NODE_TYPES:
+            self[node_type] = getattr(visitor, f"visit_{node_type.__name__}", visitor.generic_visit)
+
+    # other classes get the method of the first node class in their MRO, and are added to
+    # the table the first time they're visited
+    def __missing__(self, node_type: type) -> Callable[..., Any]:
+        method = next(
+            (self[t] for t in node_type.__mro__ if t in _KIND_CODES), self.visitor.generic_visit
+        )
+        self[node_type] = method
+        return method
+
+
+class Visitor[T]:
+    """Base class for passes over a tree of nodes.
+
+    visit(node, *args) calls the method named visit_<class name> of the node's class, like
+    visit_BinaryOp(node, *args), or generic_visit(node, *args) if the pass doesn't have one.
+    The methods are looked up once per Visitor subclass, so a visit is one dict lookup instead
+    of a chain of isinstance checks. Subclasses of node classes, like the lazy blocks of the
+    parser, are visited with the method of their node class.
+
+    `args` are passed as they are, e.g. the symbol table of the scope that the node is in.
+    Passes that visit a lot of nodes can skip the call to visit() by calling the method from
+    the dispatch table themselves: `self.dispatch[type(node)](self, node, *args)`.
+    """
+
+    dispatch: "_Dispatch"
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls.dispatch = _Dispatch(cls)
+
+    def visit(self, node: Expression, *args: Any) -> T:
+        return self.dispatch[type(node)](self, node, *args)
+
+    # visits the children, in field order
+    def generic_visit(self, node: Expression, *args: Any) -> Any:
+        for child in _children(node):
+            if child is not None and child is not NO_RESULT:
+                self.visit(child, *args)
+        return None
+
+
+class Transformer(Visitor[Expression]):
+    """A Visitor that returns a new tree.
+
+    By default a node is returned with its children replaced by the results of visiting them.
+    Nodes are never modified, since they may be shared (see HashCons): when any child changes,
+    the result is a copy of the node, and when none do, it's the node itself.
+    """
+
+    def generic_visit(self, node: Expression, *args: Any) -> Expression:
+        changes: dict[str, object] = {}
+        for name in child_fields(type(node)):
+            value = getattr(node, name)
+            if isinstance(value, list):
+                items = [self.visit(item, *args) for item in value]
+                if any(item is not old for item, old in zip(items, value)):
+                    changes[name] = items
+            elif isinstance(value, Expression) and value is not NO_RESULT:
+                new_value = self.visit(value, *args)
+                if new_value is not value:
+                    changes[name] = new_value
+        if not changes:
+            return node
+        return _copy(node, changes)
+
+
+# a copy of a node with some fields changed. Subclasses, like the lazy blocks of the parser,
+# are copied as their node class.
+def _copy(node: Expression, changes: dict[str, object]) -> Expression:
+    node_type = next(t for t in type(node).__mro__ if t in _KIND_CODES)
+    values = {f.name: getattr(node, f.name) for f in fields(node_type)}
+    values.update(changes)
+    return node_type(**values)
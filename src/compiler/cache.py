@@ -0,0 +1,230 @@
+from array import array
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import fields
+from functools import cache
+import gc
+import hashlib
+import io
+import os
+import pickle
+import sys
+import tempfile
+from typing import Any
+
+import compiler.ast as ast
+from compiler.parser import parse
+from compiler.symbols import NO_SYMBOL, SYMBOLS
+from compiler.tokenizer import SourceCode, TokenBuffer, tokenize_to_buffer
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+class CompilationCache:
+    """Token buffers and ASTs of previously compiled source codes, stored on local disk.
+
+    Entries are keyed by a hash of the source code and of the compiler itself (see
+    compiler_stamp), so a changed compiler never reads entries written by an older one. When the
+    files take more than `max_size` bytes, the least recently used ones are deleted; a hit
+    touches the file, so its modification time is the time it was last used.
+
+    Entries are pickles, so the directory must only be writable by whoever runs the compiler.
+    Several processes, like the forked workers of the server, can share one directory.
+    """
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def tokenize(self, source_code: SourceCode) -> TokenBuffer:
+        return self._tokenize(self.key(source_code), source_code)
+
+    # a hit skips both tokenizing and parsing. ASTs are only stored when parsing succeeds, so
+    # source code with syntax errors is parsed again (from cached tokens) every time.
+    def parse(self, source_code: SourceCode, recover: bool = False) -> ast.Expression:
+        key = self.key(source_code)
+        node = self._load(key, "ast")
+        if node is None:
+            node = parse(self._tokenize(key, source_code), recover=recover)
+            self._store(key, "ast", _dump_ast(node))
+        return node
+
+    def key(self, source_code: SourceCode) -> str:
+        hash = hashlib.sha256(compiler_stamp().encode())
+        if isinstance(source_code, str):
+            hash.update(source_code.encode())
+        else:
+            hash.update(source_code)
+        return hash.hexdigest()
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _tokenize(self, key: str, source_code: SourceCode) -> TokenBuffer:
+        columns = self._load(key, "tokens")
+        if columns is not None:
+            return _load_tokens(source_code, columns)
+
+        tokens = tokenize_to_buffer(source_code)
+        self._store(key, "tokens", _dump_tokens(tokens))
+        return tokens
+
+    def _path(self, key: str, kind: str) -> str:
+        return os.path.join(self.directory, f"{key}.{kind}")
+
+    def _load(self, key: str, kind: str) -> Any:
+        path = self._path(key, kind)
+        try:
+            with open(path, "rb") as f, _gc_paused():
+                value = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception:
+            # a broken entry, e.g. from a full disk, is deleted and counts as a miss
+            self.misses += 1
+            _remove(path)
+            return None
+        self.hits += 1
+        return value
+
+    def _store(self, key: str, kind: str, data: bytes | None) -> None:
+        if data is None:
+            return
+        # written under a temporary name first, so other processes never read half an entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, self._path(key, kind))
+        except OSError:
+            _remove(temp_path)
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            _remove(path)
+            total -= size
+
+
+@cache
+def compiler_stamp() -> str:
+    """A hash of the Python version and of the modules that the cached entries depend on."""
+    import compiler.parser
+    import compiler.symbols
+    import compiler.tokenizer
+    import compiler.types
+
+    hash = hashlib.sha256(sys.implementation.cache_tag.encode())
+    for module in (ast, compiler.parser, compiler.symbols, compiler.tokenizer, compiler.types):
+        assert module.__file__ is not None
+        with open(module.__file__, "rb") as f:
+            hash.update(f.read())
+    with open(__file__, "rb") as f:
+        hash.update(f.read())
+    return hash.hexdigest()
+
+
+# Pickling and unpickling create no reference cycles, but they allocate an object for every
+# node, and the garbage collector would scan the growing AST over and over.
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# Symbol IDs depend on the order in which a process interned its names, so they are stored
+# with the names and mapped to the IDs of the loading process.
+
+
+def _dump_tokens(tokens: TokenBuffer) -> bytes:
+    names = {symbol: SYMBOLS.name(symbol) for symbol in set(tokens.symbols)}
+    names.pop(NO_SYMBOL, None)
+    columns = (
+        tokens.types.tobytes(),
+        tokens.starts.tobytes(),
+        tokens.ends.tobytes(),
+        tokens.symbols,
+        names,
+    )
+    return pickle.dumps(columns, pickle.HIGHEST_PROTOCOL)
+
+
+def _load_tokens(
+    source_code: SourceCode,
+    columns: tuple[bytes, bytes, bytes, "array[int]", dict[int, str]],
+) -> TokenBuffer:
+    types, starts, ends, symbols, names = columns
+    tokens = TokenBuffer(source_code)
+    tokens.types.frombytes(types)
+    tokens.starts.frombytes(starts)
+    tokens.ends.frombytes(ends)
+
+    symbol_ids = {symbol: SYMBOLS.intern(name) for symbol, name in names.items()}
+    if any(symbol != new_symbol for symbol, new_symbol in symbol_ids.items()):
+        symbol_ids[NO_SYMBOL] = NO_SYMBOL
+        symbols = array("l", map(symbol_ids.__getitem__, symbols))
+    tokens.symbols = symbols
+    return tokens
+
+
+# nodes with a symbol are pickled as constructor calls without it, and the constructor
+# interns the name again
+def _reduce_node(node: ast.Expression) -> tuple[type, tuple]:
+    return type(node), tuple(getattr(node, name) for name in _INIT_FIELDS[type(node)])
+
+
+_INIT_FIELDS: dict[type[ast.Expression], tuple[str, ...]] = {
+    node_type: tuple(f.name for f in fields(node_type) if f.name != "symbol")
+    for node_type in vars(ast).values()
+    if isinstance(node_type, type)
+    and issubclass(node_type, ast.Expression)
+    and "symbol" in {f.name for f in fields(node_type)}
+}
+_NODE_REDUCERS = {node_type: _reduce_node for node_type in _INIT_FIELDS}
+
+
+def _dump_ast(node: ast.Expression) -> bytes | None:
+    data = io.BytesIO()
+    pickler = pickle.Pickler(data, pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = _NODE_REDUCERS  # type: ignore[assignment]
+    try:
+        with _gc_paused():
+            pickler.dump(node)
+    except RecursionError:
+        # too deeply nested to pickle, it's just not cached
+        return None
+    return data.getvalue()
@@ -0,0 +1,123 @@
+from collections.abc import Callable
+import operator
+
+import compiler.ast as ast
+from compiler.symbols import (
+    AND,
+    DIVIDE,
+    EQUAL,
+    GREATER,
+    GREATER_EQUAL,
+    LESS,
+    LESS_EQUAL,
+    MINUS,
+    MODULO,
+    NOT,
+    NOT_EQUAL,
+    OR,
+    PLUS,
+    TIMES,
+)
+
+# Int is a 64-bit signed integer. Results outside of it aren't folded, so whatever the program
+# does with them at run time is left as it is.
+INT_MIN = -(2**63)
+INT_MAX = 2**63 - 1
+
+
+# / and % round towards zero, like the division instruction
+def _divide(a: int, b: int) -> int:
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+
+def _modulo(a: int, b: int) -> int:
+    return a - b * _divide(a, b)
+
+
+_INT_OPERATORS: dict[int, Callable[..., int | bool]] = {
+    PLUS: operator.add,
+    MINUS: operator.sub,
+    TIMES: operator.mul,
+    DIVIDE: _divide,
+    MODULO: _modulo,
+    LESS: operator.lt,
+    LESS_EQUAL: operator.le,
+    GREATER: operator.gt,
+    GREATER_EQUAL: operator.ge,
+    EQUAL: operator.eq,
+    NOT_EQUAL: operator.ne,
+}
+
+_BOOL_OPERATORS: dict[int, Callable[..., int | bool]] = {
+    AND: operator.and_,
+    OR: operator.or_,
+    EQUAL: operator.eq,
+    NOT_EQUAL: operator.ne,
+}
+
+
+def fold_constants(node: ast.Expression) -> ast.Expression:
+    return _CONSTANT_FOLDER.visit(node)
+
+
+class ConstantFolder(ast.Transformer):
+    """Replaces operations on literals with their results, and conditionals with a literal
+    condition with the branch that's taken.
+
+    This runs after type checking, so the operands have the right types. The literals get the
+    location of the operation they replace, so errors found later still point at the source
+    code. Division and remainder by zero are left to fail at run time.
+    """
+
+    def visit_BinaryOp(self, node: ast.BinaryOp) -> ast.Expression:
+        node = self.generic_visit(node)  # type: ignore[assignment]
+        left, right = node.left, node.right
+        if not isinstance(left, ast.Literal) or not isinstance(right, ast.Literal):
+            return node
+
+        # bool is a subclass of int, so the types are compared exactly
+        operation: Callable[..., int | bool] | None
+        if type(left.value) is int and type(right.value) is int:
+            if node.symbol in (DIVIDE, MODULO) and right.value == 0:
+                return node
+            operation = _INT_OPERATORS.get(node.symbol)
+        elif type(left.value) is bool and type(right.value) is bool:
+            operation = _BOOL_OPERATORS.get(node.symbol)
+        else:
+            return node
+        if operation is None:
+            return node
+
+        value = operation(left.value, right.value)
+        if type(value) is int and not INT_MIN <= value <= INT_MAX:
+            return node
+        return ast.Literal(node.location, value)
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> ast.Expression:
+        node = self.generic_visit(node)  # type: ignore[assignment]
+        right = node.right
+        if not isinstance(right, ast.Literal):
+            return node
+
+        if node.symbol == MINUS and type(right.value) is int and -right.value <= INT_MAX:
+            return ast.Literal(node.location, -right.value)
+        if node.symbol == NOT and type(right.value) is bool:
+            return ast.Literal(node.location, not right.value)
+        return node
+
+    # without an else, the type of the conditional is Unit and not the type of `then`, so
+    # those are left as they are
+    def visit_Conditional(self, node: ast.Conditional) -> ast.Expression:
+        node = self.generic_visit(node)  # type: ignore[assignment]
+        cond = node.cond_if
+        if node.cond_else is None or not isinstance(cond, ast.Literal):
+            return node
+        if cond.value is True:
+            return node.then
+        if cond.value is False:
+            return node.cond_else
+        return node
+
+
+_CONSTANT_FOLDER = ConstantFolder()
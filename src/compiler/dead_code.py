@@ -0,0 +1,143 @@
+import compiler.ast as ast
+from compiler.symbols import ASSIGN, DIVIDE, MODULO
+
+
+def eliminate_dead_code(node: ast.Expression) -> tuple[ast.Expression, int]:
+    """Remove unreachable branches and statements without side effects. Returns the new tree
+    and the number of nodes of `node` that aren't in it."""
+    eliminator = DeadCodeEliminator()
+    return eliminator.visit(node), eliminator.removed
+
+
+def is_pure(node: ast.Expression) -> bool:
+    return _PURITY.visit(node)
+
+
+class Purity(ast.Visitor[bool]):
+    """Whether evaluating a node has no effects besides computing its value, so that it can be
+    left out when the value isn't used.
+
+    Assignments and function calls have effects: the built-in functions print_int, print_bool
+    and read_int all do I/O, and there are no others. A while loop may not end, and division
+    and remainder fail when dividing by zero, so they count as effects too unless the divisor
+    is a literal other than zero.
+    """
+
+    def visit_Literal(self, node: ast.Literal) -> bool:
+        return True
+
+    def visit_Identifier(self, node: ast.Identifier) -> bool:
+        return True
+
+    def visit_BinaryOp(self, node: ast.BinaryOp) -> bool:
+        if node.symbol == ASSIGN:
+            return False
+        if node.symbol in (DIVIDE, MODULO):
+            right = node.right
+            if not isinstance(right, ast.Literal) or right.value == 0:
+                return False
+        return self.visit(node.left) and self.visit(node.right)
+
+    def visit_UnaryOp(self, node: ast.UnaryOp) -> bool:
+        return self.visit(node.right)
+
+    def visit_Conditional(self, node: ast.Conditional) -> bool:
+        return (
+            self.visit(node.cond_if)
+            and self.visit(node.then)
+            and (node.cond_else is None or self.visit(node.cond_else))
+        )
+
+    def visit_FunctionCall(self, node: ast.FunctionCall) -> bool:
+        return False
+
+    # the variables of a block go out of scope at its end, so declaring them isn't an effect
+    def visit_Block(self, node: ast.Block) -> bool:
+        for statement in node.statements:
+            if isinstance(statement, ast.VariableDeclaration):
+                statement = statement.initializer
+            if not self.visit(statement):
+                return False
+        result = node.result
+        return result is None or result is ast.NO_RESULT or self.visit(result)
+
+    # the variable is declared in the enclosing scope
+    def visit_VariableDeclaration(self, node: ast.VariableDeclaration) -> bool:
+        return False
+
+    def visit_While(self, node: ast.While) -> bool:
+        return False
+
+
+class DeadCodeEliminator(ast.Transformer):
+    """Replaces conditionals and while loops with a literal condition by the code that runs,
+    and removes the statements of blocks that are pure (see Purity). The result of a block is
+    its value, so it's always kept.
+
+    `removed` is the number of nodes in the tree minus the number in the result. A pruned
+    conditional or loop whose value is Unit is replaced by an empty block, which counts as the
+    same node.
+    """
+
+    def __init__(self) -> None:
+        self.removed = 0
+
+    def visit_Conditional(self, node: ast.Conditional) -> ast.Expression:
+        node = self.generic_visit(node)  # type: ignore[assignment]
+        cond = node.cond_if
+        if not isinstance(cond, ast.Literal) or type(cond.value) is not bool:
+            return node
+
+        taken: ast.Expression | None
+        skipped: ast.Expression | None
+        if cond.value:
+            taken, skipped = node.then, node.cond_else
+        else:
+            taken, skipped = node.cond_else, node.then
+        self.removed += _size(cond) + (0 if skipped is None else _size(skipped))
+        if node.cond_else is not None:
+            self.removed += 1
+            return taken  # type: ignore[return-value]
+        # without an else, the value is Unit
+        statements = [] if taken is None else [taken]
+        return self.remove_pure_statements(ast.Block(node.location, statements))
+
+    def visit_While(self, node: ast.While) -> ast.Expression:
+        node = self.generic_visit(node)  # type: ignore[assignment]
+        cond = node.cond
+        if isinstance(cond, ast.Literal) and cond.value is False:
+            self.removed += _size(cond) + _size(node.body)
+            return ast.Block(node.location, [])
+        return node
+
+    def visit_Block(self, node: ast.Block) -> ast.Expression:
+        return self.remove_pure_statements(self.generic_visit(node))  # type: ignore[arg-type]
+
+    def remove_pure_statements(self, node: ast.Block) -> ast.Block:
+        statements = []
+        for statement in node.statements:
+            if not isinstance(statement, ast.VariableDeclaration) and is_pure(statement):
+                self.removed += _size(statement)
+            else:
+                statements.append(statement)
+        if len(statements) == len(node.statements):
+            return node
+        return ast.Block(node.location, statements, node.result)
+
+
+class _NodeCount(ast.Visitor[None]):
+    def __init__(self) -> None:
+        self.count = 0
+
+    def generic_visit(self, node: ast.Expression) -> None:
+        self.count += 1
+        super().generic_visit(node)
+
+
+def _size(node: ast.Expression) -> int:
+    counter = _NodeCount()
+    counter.visit(node)
+    return counter.count
+
+
+_PURITY = Purity()
@@ -1,86 +1,104 @@
 from dataclasses import dataclass
 from typing import Any, Callable
 import compiler.ast as ast
+from compiler.symbols import LESS, MINUS, PLUS
 
 type Value = int | bool | None
 
 
 @dataclass
 class SymTab:
-    locals: dict[str, int | str | bool]
+    # keys are symbol IDs, see compiler.symbols
+    locals: dict[int, int | str | bool]
     parent: "SymTab" = None
 
 
+def _add_top_level_symbols(tab: SymTab) -> None:
+    tab.locals[PLUS] = lambda x, y: x + y
+    tab.locals[MINUS] = lambda x, y: x - y
+    tab.locals[LESS] = lambda x, y: x < y
+
+
+def _get_top_level_operation(symbol: int, tab: SymTab) -> Callable[..., Any]:
+    while tab.parent is not None:
+        tab = tab.parent
+
+    return tab.locals[symbol]
+
+
 # mistä tiedetään, millä hierarkisella tasolla kullakin hetkellä ollaan?
 def interpret(node: ast.Expression, sym_tab: SymTab = None) -> Value:
-    current_tab: SymTab = SymTab({}, sym_tab)
+    return _INTERPRETER.visit(node, sym_tab)
+
 
-    def add_symbol(node: ast.VariableDeclaration):
-        value = interpret(node.initializer, current_tab)
-        current_tab.locals[node.name] = value
+class Interpreter(ast.Visitor[Value]):
+    """The visit methods return the value of a node, and take the symbol table of the node's
+    parent, None at the top level. Nodes with children give them a new table of their own,
+    which is where identifiers are looked for first."""
 
-    def add_top_level_symbols() -> None:
-        current_tab.locals["+"] = lambda x, y: x + y
-        current_tab.locals["-"] = lambda x, y: x - y
-        current_tab.locals["<"] = lambda x, y: x < y
+    def scope(self, sym_tab: SymTab) -> SymTab:
+        current_tab = SymTab({}, sym_tab)
+        if sym_tab is None:
+            _add_top_level_symbols(current_tab)
+        return current_tab
 
-    def get_top_level_operation(symbol: str) -> Callable[..., Any]:
-        tab: SymTab = current_tab
+    def add_symbol(self, node: ast.VariableDeclaration, current_tab: SymTab) -> None:
+        value = self.visit(node.initializer, current_tab)
+        current_tab.locals[node.symbol] = value
 
-        while tab.parent is not None:
-            tab = tab.parent
+    # other nodes aren't evaluated yet
+    def generic_visit(self, node: ast.Expression, sym_tab: SymTab) -> Value:
+        return None
 
-        return tab.locals[symbol]
+    def visit_Literal(self, node: ast.Literal, sym_tab: SymTab) -> Value:
+        return node.value
 
-    if sym_tab is None:
-        add_top_level_symbols()
+    def visit_VariableDeclaration(self, node: ast.VariableDeclaration, sym_tab: SymTab) -> Value:
+        self.add_symbol(node, self.scope(sym_tab))
+        return None
 
-    match node:
-        case ast.Literal():
-            return node.value
+    def visit_Identifier(self, node: ast.Identifier, sym_tab: SymTab) -> Value:
+        table = sym_tab
+        identifier = None
 
-        case ast.VariableDeclaration():
-            add_symbol(node)
+        try:
+            while node.symbol not in table.locals.keys():
+                table = sym_tab.parent
+            identifier = table.locals[node.symbol]
+        except:
+            raise Exception(f"{node.location}: could not find value for identifier {node.name}")
+
+        return identifier
+
+    def visit_Block(self, node: ast.Block, sym_tab: SymTab) -> Value:
+        current_tab = self.scope(sym_tab)
+        for expr in node.statements:
+            if isinstance(expr, ast.VariableDeclaration):
+                self.add_symbol(expr, current_tab)
+
+        if isinstance(node.result, ast.Literal) and node.result.value is None:
             return None
+        else:
+            # jos on Identifier, niin pitäisi aina löytyä sym_tablesta
+            if isinstance(expr, ast.Identifier):
+                print("asd")
+            else:
+                return self.visit(node.result, current_tab)
 
-        case ast.Identifier():
-            table = sym_tab
-            identifier = None
+    def visit_BinaryOp(self, node: ast.BinaryOp, sym_tab: SymTab) -> Value:
+        current_tab = self.scope(sym_tab)
+        a: Any = self.visit(node.left, current_tab)
+        b: Any = self.visit(node.right, current_tab)
 
-            try:
-                while node.name not in table.locals.keys():
-                    table = sym_tab.parent
-                identifier = table.locals[node.name]
-            except:
-                raise Exception(
-                    f"{node.location}: could not find value for identifier {node.name}"
-                )
+        operation = _get_top_level_operation(node.symbol, current_tab)
+        return operation(a, b)
 
-            return identifier
+    def visit_Conditional(self, node: ast.Conditional, sym_tab: SymTab) -> Value:
+        current_tab = self.scope(sym_tab)
+        if self.visit(node.cond_if, None):
+            return self.visit(node.then, current_tab)
+        else:
+            return self.visit(node.cond_else, current_tab)
 
-        case ast.Block():
-            for expr in node.statements:
-                if isinstance(expr, ast.VariableDeclaration):
-                    add_symbol(expr)
 
-            if isinstance(node.result, ast.Literal) and node.result.value is None:
-                return None
-            else:
-                # jos on Identifier, niin pitäisi aina löytyä sym_tablesta
-                if isinstance(expr, ast.Identifier):
-                    print("asd")
-                else:
-                    return interpret(node.result, current_tab)
-
-        case ast.BinaryOp():
-            a: Any = interpret(node.left, current_tab)
-            b: Any = interpret(node.right, current_tab)
-
-            operation = get_top_level_operation(node.op)
-            return operation(a, b)
-
-        case ast.Conditional():
-            if interpret(node.cond_if):
-                return interpret(node.then, current_tab)
-            else:
-                return interpret(node.cond_else, current_tab)
+_INTERPRETER = Interpreter()
@@ -1,16 +1,172 @@
-from compiler.tokenizer import Token
+from bisect import bisect_left
+from collections.abc import Callable, Generator, Iterable, Iterator, Sequence
+from compiler.symbols import (
+    AND,
+    ASSIGN,
+    COLON,
+    COMMA,
+    DIVIDE,
+    DO,
+    ELSE,
+    EQUAL,
+    FALSE,
+    GREATER,
+    GREATER_EQUAL,
+    IF,
+    LEFT_BRACE,
+    LEFT_PAREN,
+    LESS,
+    LESS_EQUAL,
+    MINUS,
+    MODULO,
+    NOT,
+    NOT_EQUAL,
+    NO_SYMBOL,
+    OR,
+    PLUS,
+    RIGHT_BRACE,
+    RIGHT_PAREN,
+    SEMICOLON,
+    SYMBOLS,
+    THEN,
+    TIMES,
+    TRUE,
+    VAR,
+    WHILE,
+)
+from compiler.tokenizer import (
+    TOKEN_TYPES,
+    Location,
+    Token,
+    TokenBuffer,
+    TokenEdit,
+)
 import compiler.ast as ast
 from compiler.types import BasicType
+from typing import Literal
+
+# binary operator -> (precedence, associativity), higher precedence binds tighter
+BINARY_OPERATORS: dict[int, tuple[int, Literal["left", "right"]]] = {
+    ASSIGN: (1, "right"),
+    OR: (2, "left"),
+    AND: (3, "left"),
+    EQUAL: (4, "left"),
+    NOT_EQUAL: (4, "left"),
+    LESS: (5, "left"),
+    LESS_EQUAL: (5, "left"),
+    GREATER: (5, "left"),
+    GREATER_EQUAL: (5, "left"),
+    PLUS: (6, "left"),
+    MINUS: (6, "left"),
+    TIMES: (7, "left"),
+    DIVIDE: (7, "left"),
+    MODULO: (7, "left"),
+}
+
+
+# A grammar rule. Instead of calling the rule of a nested construct, a rule yields it (or a node
+# that was parsed without nesting) and gets the parsed node sent back; see run() in parse.
+type Rule = Generator[Rule | ast.Expression, ast.Expression, ast.Expression]
+
+
+class ParseError(Exception):
+    def __init__(self, *diagnostics: str) -> None:
+        super().__init__("\n".join(diagnostics))
+        self.diagnostics = list(diagnostics)
+
+
+# recover=True keeps parsing after a syntax error and raises a single ParseError with
+# every error in its diagnostics
+# cache is used by IncrementalParser
+# lazy=True skips the bodies of blocks and parses them the first time their statements or
+# result are read, see _LazyBlock. Syntax errors in them are raised at that point.
+# hash_cons shares identical subtrees through the given table, see ast.HashCons. Every
+# top-level expression is shared as soon as it's parsed, so the duplicates of only one of them
+# are in memory at a time. It can't be used with lazy or cache, which modify their nodes later.
+def parse(
+    tokens: Sequence[Token],
+    recover: bool = False,
+    cache: "IncrementalParser | None" = None,
+    lazy: bool = False,
+    hash_cons: ast.HashCons | None = None,
+) -> ast.Expression:
+    if hash_cons is not None and (lazy or cache is not None):
+        raise ValueError("hash_cons can't be used with lazy or cache")
+    parsed_ast = _parse(tokens, None, recover, cache, lazy, hash_cons)
+    assert isinstance(parsed_ast, ast.Expression)
+    if hash_cons is not None:
+        # the top-level expressions are shared already, this only adds the Block
+        parsed_ast = hash_cons.share(parsed_ast)
+    return parsed_ast
+
+
+def parse_stream(
+    tokens: Iterable[Token],
+    recover: bool = False,
+    hash_cons: ast.HashCons | None = None,
+) -> Iterator[ast.Expression]:
+    """Parse the top-level expressions of a program one at a time.
 
+    Tokens are pulled from `tokens` only as far as the parser needs them, and each top-level
+    expression is yielded as soon as it's complete, which is right after its ";". The yielded
+    expressions are the statements and the result of the Block that parse() would return, and
+    neither the tokens nor the expressions are kept after that, so e.g. the output of
+    iter_tokens() can be parsed in memory bounded by the longest top-level expression.
 
-def parse(tokens: list[Token]) -> ast.Expression:
+    Syntax errors are raised when they're reached. With recover=True the expressions around
+    them are still yielded and the errors are raised together at the end.
+
+    With hash_cons, the yielded expressions are shared with the earlier ones through it.
+    """
+    expressions = _parse([], iter(tokens), recover, None, False, hash_cons)
+    assert not isinstance(expressions, ast.Expression)
+    return expressions
+
+
+# stream is given by parse_stream, which reads tokens from it into the empty `tokens` list
+def _parse(
+    tokens: Sequence[Token],
+    stream: Iterator[Token] | None,
+    recover: bool,
+    cache: "IncrementalParser | None",
+    lazy: bool,
+    hash_cons: ast.HashCons | None,
+) -> ast.Expression | Iterator[ast.Expression]:
     pos = 0
+    diagnostics: list[str] | None = [] if recover else None
+    last_error_pos = -1
+
+    # lookahead compares symbol IDs and types, read from the buffer's columns when possible
+    symbols: Sequence[int]
+    type_codes: Sequence[int]
+    if isinstance(tokens, TokenBuffer):
+        symbols = tokens.symbols
+        type_codes = tokens.types
+    else:
+        symbols = [token.symbol for token in tokens]
+        type_codes = [TOKEN_TYPES.index(token.type) for token in tokens]
+    token_count = len(symbols)
+
+    # reads the next token of the stream, if there is one
+    def fill() -> bool:
+        nonlocal token_count
+        if stream is None:
+            return False
+        token = next(stream, None)
+        if token is None:
+            return False
+        assert isinstance(tokens, list) and isinstance(symbols, list)
+        tokens.append(token)
+        symbols.append(token.symbol)
+        type_codes.append(TOKEN_TYPES.index(token.type))  # type: ignore[attr-defined]
+        token_count += 1
+        return True
 
     def peek() -> Token:
-        if pos < len(tokens):
+        if pos < token_count or fill():
             return tokens[pos]
-        elif len(tokens) == 0:
-            raise Exception("attempting to parse an empty token list")
+        elif token_count == 0:
+            raise ParseError("attempting to parse an empty token list")
         else:
             return Token(
                 location=tokens[-1].location,
@@ -18,311 +174,621 @@ def parse(tokens: list[Token]) -> ast.Expression:
                 text="",
             )
 
-    def consume(expected: str | list[str] | None = None) -> Token:
+    def peek_symbol() -> int:
+        if pos < token_count or fill():
+            return symbols[pos]
+        return NO_SYMBOL
+
+    def peek_type() -> str:
+        if pos < token_count or fill():
+            return TOKEN_TYPES[type_codes[pos]]
+        return "end"
+
+    # consumes a token that the lookahead already checked, without building a Token for it
+    def skip() -> None:
+        nonlocal pos
+        pos += 1
+
+    def consume(expected: int | list[int] | None = None) -> Token:
         nonlocal pos
 
         token = peek()
-        if isinstance(expected, str) and token.text != expected:
-            raise Exception(f'{token.location}: expected "{expected}"')
-        if isinstance(expected, list) and token.text not in expected:
-            comma_separated = ", ".join([f'"{e}"' for e in expected])
-            raise Exception(f"{token.location}: expected one of: {comma_separated}")
+        if isinstance(expected, int) and token.symbol != expected:
+            raise ParseError(f'{token.location}: expected "{SYMBOLS.name(expected)}"')
+        if isinstance(expected, list) and token.symbol not in expected:
+            comma_separated = ", ".join([f'"{SYMBOLS.name(e)}"' for e in expected])
+            raise ParseError(f"{token.location}: expected one of: {comma_separated}")
         pos += 1
 
         return token
 
+    # panic mode: report the error and skip to the end of the statement, which is after
+    # the next ";" or (in a block) before the "}" that closes the block
+    def recover_from(error: ParseError, in_block: bool) -> None:
+        nonlocal pos, last_error_pos
+        assert diagnostics is not None
+
+        # an error at the same token as the previous one is a consequence of it
+        if pos > last_error_pos:
+            diagnostics.extend(error.diagnostics)
+            last_error_pos = pos
+
+        depth = 0
+        while peek_type() != "end":
+            symbol = peek_symbol()
+            if symbol == SEMICOLON and depth == 0:
+                pos += 1
+                return
+            elif symbol == LEFT_BRACE:
+                depth += 1
+            elif symbol == RIGHT_BRACE:
+                if depth == 0 and in_block:
+                    return
+                depth = max(depth - 1, 0)
+            pos += 1
+
     def parse_int_literal() -> ast.Literal:
-        if peek().type != "int_literal":
-            raise Exception(f"{peek().location}: expected an integer literal")
+        if peek_type() != "int_literal":
+            raise ParseError(f"{peek().location}: expected an integer literal")
         token = consume()
 
         return ast.Literal(token.location, int(token.text))
 
     def parse_boolean_literal() -> ast.Literal:
-        if peek().type != "identifier":
-            raise Exception(f"{peek().location}: expected an identifier")
+        if peek_type() != "identifier":
+            raise ParseError(f"{peek().location}: expected an identifier")
         token = consume()
 
-        if token.text == "true":
+        if token.symbol == TRUE:
             return ast.Literal(token.location, True)
         return ast.Literal(token.location, False)
 
-    # only_identifier means that the parsing should not allow / expect function calls
-    def parse_identifier(only_identifier=False) -> ast.Identifier | ast.FunctionCall:
-        if peek().type != "identifier":
-            raise Exception(f"{peek().location}: expected an identifier")
-        if peek().text == "var":
-            raise Exception(
-                f"{peek().location}: attempting to declare a variable outside top-level scope"
-            )
-
-        token = consume()
-
-        if peek().text == "(" and only_identifier is False:
-            return parse_function(token)
-
-        return ast.Identifier(token.location, str(token.text))
-
-    def parse_expression(allow_var_parsing=False) -> ast.Expression:
-        if allow_var_parsing and peek().text == "var":
-            return parse_variable_declaration()
-
-        return parse_assignment()
-
-    def parse_assignment() -> ast.Expression:
-        left = parse_or()
-
-        if peek().text == "=":
-            operator_token = consume()
-            operator = operator_token.text
-
-            right = parse_assignment()
-            left = ast.BinaryOp(operator_token.location, left, operator, right)
-
-        return left
-
-    def parse_or() -> ast.Expression:
-        left = parse_and()
-
-        while peek().text == "or":
-            operator_token = consume()
-            operator = operator_token.text
-            right = parse_and()
-            left = ast.BinaryOp(operator_token.location, left, operator, right)
-
-        return left
-
-    def parse_and() -> ast.Expression:
-        left = parse_equality()
-
-        while peek().text == "and":
-            operator_token = consume()
-            operator = operator_token.text
-            right = parse_equality()
-            left = ast.BinaryOp(operator_token.location, left, operator, right)
-
-        return left
-
-    def parse_equality() -> ast.Expression:
-        left = parse_comparison()
-
-        while peek().text in ["!=", "=="]:
-            operator_token = consume()
-            operator = operator_token.text
-            right = parse_comparison()
-            left = ast.BinaryOp(operator_token.location, left, operator, right)
-
-        return left
-
-    def parse_comparison() -> ast.Expression:
-        left = parse_arithmetic()
-
-        while peek().text in ["<", "<=", ">", ">="]:
-            operator_token = consume()
-            operator = operator_token.text
-            right = parse_arithmetic()
-            left = ast.BinaryOp(operator_token.location, left, operator, right)
+    # The rules are driven with an explicit stack: run() keeps the suspended rules on a list, so
+    # deep nesting costs heap memory instead of Python call stack. A ParseError raised by a rule
+    # is thrown into the rule that yielded it, which may recover from it.
+    def run(rule: Rule | ast.Expression) -> ast.Expression:
+        if isinstance(rule, ast.Expression):
+            return rule
+        stack = [rule]
+        result: ast.Expression | None = None
+        error: ParseError | None = None
+        while True:
+            try:
+                if error is None:
+                    next_rule = stack[-1].send(result)  # type: ignore[arg-type]
+                else:
+                    thrown, error = error, None
+                    next_rule = stack[-1].throw(thrown)
+            except StopIteration as e:
+                stack.pop()
+                if not stack:
+                    return e.value
+                result = e.value
+                continue
+            except ParseError as e:
+                stack.pop()
+                if not stack:
+                    raise
+                error = e
+                continue
+            if isinstance(next_rule, ast.Expression):
+                result = next_rule
+            else:
+                stack.append(next_rule)
+                result = None
+
+    # with a cache, statements and blocks whose tokens haven't changed since the previous
+    # parse are taken from it instead of parsed again
+    def cached_rule(is_block: bool, subtree_rule: Callable[[], Rule]) -> Rule:
+        nonlocal pos
+        assert cache is not None
 
-        return left
+        start = pos
+        reused = cache.reuse(start, is_block)
+        if reused is not None:
+            pos, node = reused
+            return node
 
-    def parse_arithmetic() -> ast.Expression:
-        left = parse_term()
+        node = yield subtree_rule()
+        cache.store(start, pos, is_block, node)
+        return node
 
-        while peek().text in ["+", "-"]:
-            operator_token = consume()
-            operator = operator_token.text
-            right = parse_term()
-            left = ast.BinaryOp(operator_token.location, left, operator, right)
+    def statement_rule() -> Rule:
+        if peek_symbol() == VAR:
+            return variable_declaration_rule()
 
-        return left
+        return binary_rule()
 
-    def parse_term() -> ast.Expression:
-        left = parse_factor()
+    def expression_rule(allow_var_parsing: bool = False) -> Rule:
+        # var is only allowed in top-level and block statements
+        if allow_var_parsing:
+            if cache is not None:
+                return cached_rule(False, statement_rule)
+            return statement_rule()
 
-        while peek().text in ["*", "/", "%"]:
-            operator_token = consume()
-            operator = operator_token.text
-            right = parse_factor()
-            left = ast.BinaryOp(operator_token.location, left, operator, right)
+        return binary_rule()
 
-        return left
+    def binary_rule(min_precedence: int = 1) -> Rule:
+        left = yield factor_rule()
 
-    """
-    def parse_unary() -> ast.Expression:
-        left = parse_factor()
+        while True:
+            operator = BINARY_OPERATORS.get(peek_symbol())
+            if operator is None or operator[0] < min_precedence:
+                return left
+            precedence, associativity = operator
 
-        while peek().text in ["not", "-"]:
             operator_token = consume()
-            operator = operator_token.text
-            right = parse_factor()
-            left = ast.BinaryOp(left, operator, right)
-
-        return left
-    """
+            right = yield binary_rule(
+                precedence + 1 if associativity == "left" else precedence
+            )
+            left = ast.BinaryOp(
+                operator_token.location,
+                left,
+                operator_token.text,
+                right,
+                operator_token.symbol,
+            )
 
-    def parse_factor() -> ast.Expression:
-        if peek().text == "(":
-            return parse_parenthesized()
-        elif peek().text == "if":
-            return parse_conditional()
-        elif peek().text == "while":
-            return parse_while()
-        elif peek().text in ["true", "false"]:
+    def factor_rule() -> Rule | ast.Expression:
+        symbol = peek_symbol()
+        if symbol == LEFT_PAREN:
+            return parenthesized_rule()
+        elif symbol == IF:
+            return conditional_rule()
+        elif symbol == WHILE:
+            return while_rule()
+        elif symbol == TRUE or symbol == FALSE:
             return parse_boolean_literal()
-        elif peek().type == "int_literal":
+        elif peek_type() == "int_literal":
             return parse_int_literal()
         # all identifiers are treated the same in the tokenizer
         # therefore known identifiers (while, var, ...) need to be handled before this
-        elif peek().type == "identifier":
-            return parse_identifier()
-        # should be above parse_factor in precedence, but does having it here cause anything?
-        # other option: parse_term calls parse_operation that calls parse_factor
-        elif peek().text in ["not", "-"]:
-            return parse_unary_operation()
-        elif peek().text == "{":
-            return parse_block()
+        elif peek_type() == "identifier":
+            return identifier_rule()
+        # should be above factor_rule in precedence, but does having it here cause anything?
+        # other option: binary_rule yields an operation rule that yields factor_rule
+        elif symbol == NOT or symbol == MINUS:
+            return unary_operation_rule()
+        elif symbol == LEFT_BRACE:
+            if cache is not None:
+                return cached_rule(True, block_rule)
+            if lazy:
+                return lazy_block_rule()
+            return block_rule()
         else:
-            raise Exception(
+            raise ParseError(
                 f'{peek().location}: expected "(", "if", an integer literal or an identifier'
             )
 
-    def parse_unary_operation() -> ast.UnaryOp:
+    # only_identifier means that the parsing should not allow / expect function calls
+    def identifier_rule(only_identifier: bool = False) -> Rule | ast.Expression:
+        if peek_type() != "identifier":
+            raise ParseError(f"{peek().location}: expected an identifier")
+        if peek_symbol() == VAR:
+            raise ParseError(
+                f"{peek().location}: attempting to declare a variable outside top-level scope"
+            )
+
+        token = consume()
+
+        if peek_symbol() == LEFT_PAREN and only_identifier is False:
+            return function_rule(token)
+
+        return ast.Identifier(token.location, token.text, token.symbol)
+
+    def unary_operation_rule() -> Rule:
         operator_token = consume()
-        expr = parse_expression()
+        expr = yield expression_rule()
 
-        return ast.UnaryOp(operator_token.location, operator_token.text, expr)
+        return ast.UnaryOp(
+            operator_token.location, operator_token.text, expr, operator_token.symbol
+        )
 
-    def parse_conditional() -> ast.Conditional:
-        if_token = consume("if")
-        if_expr = parse_expression()
+    def conditional_rule() -> Rule:
+        if_token = consume(IF)
+        if_expr = yield expression_rule()
 
-        consume("then")
-        then_expr = parse_expression()
+        consume(THEN)
+        then_expr = yield expression_rule()
 
-        if peek().text == "else":
-            consume("else")
-            else_expr = parse_expression()
+        if peek_symbol() == ELSE:
+            consume(ELSE)
+            else_expr = yield expression_rule()
             return ast.Conditional(if_token.location, if_expr, then_expr, else_expr)
 
         return ast.Conditional(if_token.location, if_expr, then_expr)
 
-    def parse_function(function_token: Token) -> ast.FunctionCall:
+    def function_rule(function_token: Token) -> Rule:
         args: list[ast.Expression] = []
-        consume("(")
+        consume(LEFT_PAREN)
 
-        first_arg = parse_expression()
-        args.append(first_arg)
+        args.append((yield expression_rule()))
 
-        while peek().text == ",":
-            consume(",")
+        while peek_symbol() == COMMA:
+            consume(COMMA)
+            args.append((yield expression_rule()))
 
-            arg = parse_expression()
-            args.append(arg)
+        consume(RIGHT_PAREN)
 
-        consume(")")
-
-        return ast.FunctionCall(function_token.location, function_token.text, args)
+        return ast.FunctionCall(
+            function_token.location, function_token.text, args, function_token.symbol
+        )
 
-    def parse_parenthesized() -> ast.Expression:
-        consume("(")
-        expr = parse_expression()
-        consume(")")
+    def parenthesized_rule() -> Rule:
+        consume(LEFT_PAREN)
+        expr = yield expression_rule()
+        consume(RIGHT_PAREN)
         return expr
 
     # in inner blocks, missing ; after } is allowed
-    def parse_block() -> ast.Block:
+    # index of the "}" that closes the "{" at `start`, found without parsing the tokens between
+    def matching_brace(start: int) -> int | None:
+        depth = 1
+        pos = start + 1
+        while True:
+            try:
+                end = symbols.index(RIGHT_BRACE, pos)  # type: ignore[call-arg]
+            except ValueError:
+                return None
+            depth += symbols[pos:end].count(LEFT_BRACE) - 1
+            if depth == 0:
+                return end
+            pos = end + 1
+
+    def lazy_block_rule() -> Rule | ast.Expression:
+        nonlocal pos
+        start = pos
+        end = matching_brace(start)
+        if end is None:
+            # let the parser report the missing "}"
+            return block_rule()
+
+        location = peek().location
+        pos = end + 1
+        return _LazyBlock(location, lambda: parse_lazy_block(start))
+
+    # parses a skipped block body after the parse has finished
+    def parse_lazy_block(start: int) -> ast.Block:
+        nonlocal pos, diagnostics
+        saved = pos, diagnostics
+        pos, diagnostics = start, None
+        try:
+            block = run(block_rule())
+        finally:
+            pos, diagnostics = saved
+        assert isinstance(block, ast.Block)
+        return block
+
+    def block_rule() -> Rule:
         expressions: list[ast.Expression] = []
-        block_token = consume("{")
+        block_token = consume(LEFT_BRACE)
 
         no_result_expr = False
-        while peek().text != "}":
-            expr = parse_expression(True)
-            expressions.append(expr)
-
+        while peek_symbol() != RIGHT_BRACE:
             try:
-                consume(";")
-                no_result_expr = True
-            except Exception as e:
-                if isinstance(expr, ast.Block) or peek().text == "}":
-                    no_result_expr = False
-                    continue
-                raise
+                expr = yield expression_rule(True)
+                expressions.append(expr)
 
-        consume("}")
+                if peek_symbol() == SEMICOLON:
+                    skip()
+                    no_result_expr = True
+                elif isinstance(expr, ast.Block) or peek_symbol() == RIGHT_BRACE:
+                    no_result_expr = False
+                else:
+                    # raises the missing ";" error
+                    consume(SEMICOLON)
+            except ParseError as e:
+                if diagnostics is None:
+                    raise
+                recover_from(e, in_block=True)
+                if peek_type() == "end":
+                    break
+
+        consume(RIGHT_BRACE)
 
         if no_result_expr:
             return ast.Block(block_token.location, expressions)
 
-        # except == handling an empty block
-        try:
-            result = expressions.pop()
-        except:
-            result = None
-
-        return ast.Block(block_token.location, expressions, result)
+        result = expressions.pop() if expressions else None
+        return ast.Block(block_token.location, expressions, result)  # type: ignore[arg-type]
 
-    def parse_variable_declaration() -> ast.VariableDeclaration:
-        var_token = consume("var")
-        identifier: ast.Identifier = parse_identifier(True)
+    def variable_declaration_rule() -> Rule:
+        var_token = consume(VAR)
+        identifier = yield identifier_rule(True)
+        assert isinstance(identifier, ast.Identifier)
 
         type_name = None
-        if peek().text == ":":
-            consume(":")
-            type_name = parse_identifier().name
+        if peek_symbol() == COLON:
+            consume(COLON)
+            type_name = (yield identifier_rule()).name  # type: ignore[attr-defined]
 
-        consume("=")
-        expr = parse_expression()
+        consume(ASSIGN)
+        expr = yield expression_rule()
 
         if type_name is None:
-            return ast.VariableDeclaration(var_token.location, identifier.name, expr)
+            return ast.VariableDeclaration(
+                var_token.location, identifier.name, expr, symbol=identifier.symbol
+            )
 
         return ast.VariableDeclaration(
-            var_token.location, identifier.name, expr, BasicType(type_name)
+            var_token.location,
+            identifier.name,
+            expr,
+            BasicType(type_name),
+            identifier.symbol,
         )
 
-    def parse_while() -> ast.While:
-        while_token = consume("while")
-        condition_expr = parse_expression()
-        consume("do")
-        body_expr = parse_expression()
+    def while_rule() -> Rule:
+        while_token = consume(WHILE)
+        condition_expr = yield expression_rule()
+        consume(DO)
+        body_expr = yield expression_rule()
 
         return ast.While(while_token.location, condition_expr, body_expr)
 
-    def parse_top_level_expressions(first_expr: ast.Expression) -> list[ast.Expression]:
-        expressions: list[ast.Expression] = [first_expr]
-        consume(";")
+    # parses the top-level expressions after the first ";"
+    def share(node: ast.Expression) -> ast.Expression:
+        return node if hash_cons is None else hash_cons.share(node)
 
+    def top_level_expressions_rule(
+        location: Location, expressions: list[ast.Expression]
+    ) -> Rule:
         no_result_expr = False
-        while peek().type != "end":
-            expr = parse_expression(True)
-            expressions.append(expr)
+        while peek_type() != "end":
+            try:
+                expr = yield expression_rule(True)
+            except ParseError as e:
+                if diagnostics is None:
+                    raise
+                recover_from(e, in_block=False)
+                continue
+            expressions.append(share(expr))
 
-            if peek().text == ";":
-                consume(";")
+            if peek_symbol() == SEMICOLON:
+                skip()
                 no_result_expr = True
                 continue
 
             no_result_expr = False
 
-        if no_result_expr:
-            return ast.Block(first_expr.location, expressions)
+        # expressions is only empty after recovering from errors
+        if no_result_expr or not expressions:
+            return ast.Block(location, expressions)
 
         result = expressions.pop()
-        return ast.Block(first_expr.location, expressions, result)
+        return ast.Block(location, expressions, result)
 
-    parsed_ast = parse_expression(True)
+    def parse_program() -> ast.Expression:
+        first_expr = share(run(expression_rule(True)))
 
-    last_token = peek()
+        last_token = peek()
 
-    if last_token.text == ";":
-        return_val = parse_top_level_expressions(parsed_ast)
-        return return_val
+        if last_token.symbol == SEMICOLON:
+            consume(SEMICOLON)
+            return run(top_level_expressions_rule(first_expr.location, [first_expr]))
 
-    # last token always has to be end, otherwise there's tokens that went unhandled
-    # this also handles cases like a b + c, not only garbage tokens at the end of list
-    if last_token.type != "end":
-        raise Exception(
-            f"{peek().location}: parsing ended at an unexpected token: {last_token.text}"
-        )
+        # last token always has to be end, otherwise there's tokens that went unhandled
+        # this also handles cases like a b + c, not only garbage tokens at the end of list
+        if last_token.type != "end":
+            raise ParseError(
+                f"{peek().location}: parsing ended at an unexpected token: {last_token.text}"
+            )
 
+        return first_expr
+
+    # yields the top-level expressions for parse_stream, see parse_program for the rules
+    def parse_top_level_stream() -> Iterator[ast.Expression]:
+        nonlocal pos, token_count, last_error_pos
+        assert isinstance(tokens, list) and isinstance(symbols, list)
+        assert isinstance(type_codes, list)
+
+        first = True
+        while peek_type() != "end":
+            try:
+                expr = run(expression_rule(True))
+                if first and peek_symbol() != SEMICOLON and peek_type() != "end":
+                    raise ParseError(
+                        f"{peek().location}: parsing ended at an unexpected token: {peek().text}"
+                    )
+            except ParseError as e:
+                if diagnostics is None:
+                    raise
+                recover_from(e, in_block=False)
+                continue
+            finally:
+                first = False
+
+            if peek_symbol() == SEMICOLON:
+                skip()
+            yield share(expr)
+
+            # forget the parsed tokens, except the last one for the location of errors at the end
+            consumed = min(pos, token_count - 1)
+            del tokens[:consumed], symbols[:consumed], type_codes[:consumed]
+            pos -= consumed
+            token_count -= consumed
+            last_error_pos -= consumed
+
+        if diagnostics:
+            raise ParseError(*diagnostics)
+
+    if stream is not None:
+        return parse_top_level_stream()
+
+    if diagnostics is None:
+        return parse_program()
+
+    try:
+        parsed_ast = parse_program()
+    except ParseError as e:
+        # the first top-level expression failed, look for errors in the rest (the AST
+        # isn't used, it only gets the location of the failed expression)
+        location = peek().location
+        recover_from(e, in_block=False)
+        run(top_level_expressions_rule(location, []))
+
+    if diagnostics:
+        raise ParseError(*diagnostics)
     return parsed_ast
+
+
+class IncrementalParser:
+    """Parses new versions of a token buffer, reusing the statements and blocks of the previous
+    parse whose tokens haven't changed.
+
+    The first parse() parses everything. After retokenize(), pass it the new buffer and the
+    TokenEdit: statements and blocks that end before the edit are reused as they are, the ones
+    after it are reused with their locations moved, and only the edited region is parsed again.
+    Reused nodes are shared with the previous AST, so it shouldn't be used after that.
+    """
+
+    def __init__(self) -> None:
+        self.tokens: TokenBuffer | None = None
+        # first token index -> (number of tokens, subtree)
+        self.statements: dict[int, tuple[int, ast.Expression]] = {}
+        self.blocks: dict[int, tuple[int, ast.Expression]] = {}
+
+    def parse(self, tokens: TokenBuffer, edit: TokenEdit | None = None) -> ast.Expression:
+        if edit is None or self.tokens is None:
+            self.statements = {}
+            self.blocks = {}
+        else:
+            self._move_subtrees(tokens, edit)
+        # the wrapper also keeps the line index for the next _move_subtrees
+        self.tokens = _ResolvedTokens(tokens)
+
+        return parse(self.tokens, cache=self)
+
+    def _move_subtrees(self, tokens: TokenBuffer, edit: TokenEdit) -> None:
+        assert self.tokens is not None
+        old_tokens = self.tokens
+        delta = edit.new_end - edit.old_end
+
+        # Locations only change after the edit: on the line where the edit ends, and on the
+        # following lines if the edit added or removed lines. They're computed from the first
+        # token after the edit, which is the same in both versions.
+        if edit.old_end < len(old_tokens):
+            old_position = old_tokens.starts[edit.old_end]
+        else:
+            old_position = len(old_tokens.source_code)
+        old_line, old_column = old_tokens.line_index.line_and_column(old_position)
+        new_line, new_column = tokens.line_index.line_and_column(old_position + edit.shift)
+        if new_line != old_line:
+            moved_end = len(old_tokens)
+        elif new_column != old_column:
+            # tokens on the rest of the edited line. The line index is used instead of
+            # searching for the newline, since the source code can also be bytes-like.
+            line_starts = old_tokens.line_index.line_starts
+            moved_end = (
+                bisect_left(old_tokens.starts, line_starts[old_line + 1], edit.old_end)
+                if old_line + 1 < len(line_starts)
+                else len(old_tokens)
+            )
+        else:
+            moved_end = edit.old_end
+
+        # subtrees touched by the edit are dropped and the ones after it get new token indexes
+        moved: list[tuple[int, int, ast.Expression]] = []
+
+        def shift(
+            subtrees: dict[int, tuple[int, ast.Expression]], lookahead: int
+        ) -> dict[int, tuple[int, ast.Expression]]:
+            shifted = {}
+            for start, subtree in subtrees.items():
+                if start + subtree[0] + lookahead <= edit.start:
+                    shifted[start] = subtree
+                elif start >= edit.old_end:
+                    shifted[start + delta] = subtree
+                    if start < moved_end:
+                        moved.append((start, start + subtree[0], subtree[1]))
+            return shifted
+
+        # a statement also depends on the token after it, where the parser saw it end
+        self.statements = shift(self.statements, 1)
+        self.blocks = shift(self.blocks, 0)
+
+        # subtrees can contain other subtrees, every node is moved once
+        moved.sort(key=lambda subtree: (subtree[0], -subtree[1]))
+        covered = 0
+        for start, end, node in moved:
+            if start >= covered:
+                _move_locations(
+                    node, old_line, new_line - old_line, new_column - old_column
+                )
+                covered = end
+
+    def reuse(self, start: int, is_block: bool) -> tuple[int, ast.Expression] | None:
+        subtree = (self.blocks if is_block else self.statements).get(start)
+        if subtree is None:
+            return None
+        return start + subtree[0], subtree[1]
+
+    def store(self, start: int, end: int, is_block: bool, node: ast.Expression) -> None:
+        (self.blocks if is_block else self.statements)[start] = (end - start, node)
+
+
+class _LazyBlock(ast.Block):
+    """A block from parse(lazy=True) whose statements and result are parsed when they're first
+    read. Until then it keeps the parser, and so the tokens, alive."""
+
+    __slots__ = ("_parse_body",)
+
+    def __init__(self, location: Location, parse_body: Callable[[], ast.Block]) -> None:
+        self.location = location
+        self._parse_body = parse_body
+
+    def __getattr__(self, name: str) -> object:
+        # only called before the body is parsed
+        if name != "statements" and name != "result":
+            raise AttributeError(name)
+        block = self._parse_body()
+        self.statements = block.statements
+        self.result = block.result
+        del self._parse_body
+        return getattr(self, name)
+
+    # the dataclass __eq__ only compares nodes of the same class
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ast.Block):
+            return NotImplemented
+        return (self.location, self.statements, self.result) == (
+            other.location,
+            other.statements,
+            other.result,
+        )
+
+
+class _ResolvedTokens(TokenBuffer):
+    """A token buffer whose tokens have eager locations. Subtrees of IncrementalParser are kept
+    over many versions of the source code, and lazy locations would keep the LineIndex of each
+    version alive."""
+
+    def __init__(self, tokens: TokenBuffer) -> None:
+        self.__dict__.update(tokens.__dict__)
+
+    def location(self, index: int) -> Location:
+        line, column = self.line_index.line_and_column(self.starts[index])
+        return Location(column, line)
+
+
+def _move_locations(
+    node: ast.Expression, edit_line: int, line_delta: int, column_delta: int
+) -> None:
+    nodes = [node]
+    while nodes:
+        node = nodes.pop()
+        location = node.location
+        if location is not None:
+            if location.line == edit_line:
+                node.location = Location(
+                    location.column + column_delta, location.line + line_delta
+                )
+            elif line_delta != 0:
+                node.location = Location(location.column, location.line + line_delta)
+        for name in ast.child_fields(type(node)):
+            value = getattr(node, name)
+            if isinstance(value, ast.Expression):
+                nodes.append(value)
+            elif isinstance(value, list):
+                nodes.extend(value)
+
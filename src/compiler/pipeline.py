@@ -0,0 +1,204 @@
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+import time
+import tracemalloc
+from typing import Any
+
+import compiler.ast as ast
+from compiler.cache import CompilationCache
+from compiler.constant_folding import fold_constants
+from compiler.dead_code import eliminate_dead_code
+from compiler.parser import parse
+from compiler.tokenizer import SourceCode, TokenBuffer, tokenize_file, tokenize_to_buffer
+from compiler.type_checker import typecheck
+
+# A pass gets the output of the previous one and a dict for counting things it wants to
+# report, like the number of nodes it removed.
+type PassFunction = Callable[[Any, dict[str, int]], Any]
+
+# called with the name of a pass and its input (before) or output (after)
+type Hook = Callable[[str, Any], None]
+
+
+@dataclass
+class Pass:
+    name: str
+    run: PassFunction
+    before: list[Hook] = field(default_factory=list)
+    after: list[Hook] = field(default_factory=list)
+
+
+@dataclass
+class PassStats:
+    name: str
+    seconds: float = 0.0
+    # in bytes, relative to what was allocated when the pass started. None unless the
+    # pipeline traces memory.
+    peak_memory: int | None = None
+    memory: int | None = None
+    counters: dict[str, int] = field(default_factory=dict)
+
+
+class Pipeline:
+    """Runs the stages and optimization passes of the compiler in order, each with the output
+    of the previous one.
+
+    Every pass is timed, and with trace_memory=True the memory it allocates is measured with
+    tracemalloc, which makes the passes a few times slower. The measurements of the last run()
+    are in `stats`, also for a pass that raised an exception. Hooks are called around every
+    pass (Pipeline.before and after) or around one (Pass.before and after), outside of the
+    measurements.
+    """
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.passes: list[Pass] = []
+        self.before: list[Hook] = []
+        self.after: list[Hook] = []
+        self.trace_memory = trace_memory
+        self.stats: list[PassStats] = []
+
+    def add(self, name: str, run: PassFunction) -> Pass:
+        compiler_pass = Pass(name, run)
+        self.passes.append(compiler_pass)
+        return compiler_pass
+
+    def run(self, value: Any) -> Any:
+        self.stats = []
+        # tracing that was started by someone else is left on
+        start_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if start_tracing:
+            tracemalloc.start()
+        try:
+            for compiler_pass in self.passes:
+                value = self._run_pass(compiler_pass, value)
+        finally:
+            if start_tracing:
+                tracemalloc.stop()
+        return value
+
+    def _run_pass(self, compiler_pass: Pass, value: Any) -> Any:
+        for hook in (*self.before, *compiler_pass.before):
+            hook(compiler_pass.name, value)
+
+        stats = PassStats(compiler_pass.name)
+        self.stats.append(stats)
+        start_memory = 0
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            value = compiler_pass.run(value, stats.counters)
+        finally:
+            stats.seconds = time.perf_counter() - start
+            if self.trace_memory:
+                memory, peak = tracemalloc.get_traced_memory()
+                stats.memory = memory - start_memory
+                stats.peak_memory = peak - start_memory
+
+        for hook in (*compiler_pass.after, *self.after):
+            hook(compiler_pass.name, value)
+        return value
+
+    def report(self) -> str:
+        """The stats of the last run as a table."""
+        lines = [f"{'pass':<24} {'time':>10} {'peak memory':>12} {'memory':>10}  counters"]
+        for stats in self.stats:
+            peak_memory = memory = ""
+            if stats.peak_memory is not None and stats.memory is not None:
+                peak_memory = f"{stats.peak_memory / 1e6:.1f}MB"
+                memory = f"{stats.memory / 1e6:+.1f}MB"
+            counters = " ".join(f"{name}={count}" for name, count in stats.counters.items())
+            lines.append(
+                f"{stats.name:<24} {stats.seconds * 1000:>8.1f}ms {peak_memory:>12} {memory:>10}"
+                f"  {counters}".rstrip()
+            )
+        total = sum(stats.seconds for stats in self.stats)
+        lines.append(f"{'total':<24} {total * 1000:>8.1f}ms")
+        return "\n".join(lines)
+
+    def stats_json(self) -> list[dict[str, Any]]:
+        return [asdict(stats) for stats in self.stats]
+
+
+def compiler_pipeline(
+    cache: CompilationCache | None = None,
+    constant_folding: bool = True,
+    dead_code_elimination: bool = True,
+    trace_memory: bool = False,
+    read_file: bool = False,
+) -> Pipeline:
+    """The passes of call_compiler, from source code (or a TokenBuffer) to a checked and
+    optimized AST. With read_file=True, the input is the path of a source file instead, and
+    reading it is part of the first pass, so that it's measured too."""
+    pipeline = Pipeline(trace_memory)
+    if cache is None:
+        pipeline.add("tokenize", _tokenize_file if read_file else _tokenize)
+        pipeline.add("parse", _parse)
+    else:
+        if read_file:
+            # the cache is keyed by the source code, so the file is read rather than tokenized
+            pipeline.add("read", _read_file)
+
+        # a hit skips both tokenizing and parsing, so they're one pass
+        def parse_cached(
+            source_code: SourceCode | TokenBuffer, counters: dict[str, int]
+        ) -> ast.Expression:
+            if isinstance(source_code, TokenBuffer):
+                return parse(source_code, recover=True)
+            hits = cache.hits
+            tree = cache.parse(source_code, recover=True)
+            counters["cache_hits"] = cache.hits - hits
+            return tree
+
+        pipeline.add("parse", parse_cached)
+    pipeline.add("typecheck", _typecheck)
+    if constant_folding:
+        pipeline.add("fold_constants", _fold_constants)
+    # after folding, which turns conditions into literals
+    if dead_code_elimination:
+        pipeline.add("eliminate_dead_code", _eliminate_dead_code)
+    return pipeline
+
+
+def _read_file(path: str, counters: dict[str, int]) -> bytes:
+    with open(path, "rb") as f:
+        source_code = f.read()
+    counters["bytes"] = len(source_code)
+    return source_code
+
+
+# memory-mapped, see tokenize_file
+def _tokenize_file(path: str, counters: dict[str, int]) -> TokenBuffer:
+    tokens = tokenize_file(path)
+    counters["tokens"] = len(tokens)
+    return tokens
+
+
+def _tokenize(source_code: SourceCode | TokenBuffer, counters: dict[str, int]) -> TokenBuffer:
+    # already tokenized when it was read from a memory-mapped file
+    if isinstance(source_code, TokenBuffer):
+        tokens = source_code
+    else:
+        tokens = tokenize_to_buffer(source_code)
+    counters["tokens"] = len(tokens)
+    return tokens
+
+
+# report every syntax error at once rather than stopping at the first one
+def _parse(tokens: TokenBuffer, counters: dict[str, int]) -> ast.Expression:
+    return parse(tokens, recover=True)
+
+
+def _typecheck(tree: ast.Expression, counters: dict[str, int]) -> ast.Expression:
+    typecheck(tree)
+    return tree
+
+
+def _fold_constants(tree: ast.Expression, counters: dict[str, int]) -> ast.Expression:
+    return fold_constants(tree)
+
+
+def _eliminate_dead_code(tree: ast.Expression, counters: dict[str, int]) -> ast.Expression:
+    tree, counters["removed_nodes"] = eliminate_dead_code(tree)
+    return tree
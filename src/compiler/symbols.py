@@ -0,0 +1,76 @@
+import sys
+
+# symbol of tokens that have none, i.e. integer literals
+NO_SYMBOL = -1
+
+
+class SymbolTable:
+    """Maps every identifier, keyword and operator name to a small integer ID.
+
+    Comparing and looking up symbols by ID is cheaper than by string, and every name is
+    stored only once.
+    """
+
+    def __init__(self) -> None:
+        self.ids: dict[str, int] = {}
+        self.names: list[str] = []
+
+    def intern(self, name: str) -> int:
+        symbol = self.ids.get(name)
+        if symbol is None:
+            symbol = len(self.names)
+            name = sys.intern(name)
+            self.ids[name] = symbol
+            self.names.append(name)
+        return symbol
+
+    def name(self, symbol: int) -> str:
+        return self.names[symbol]
+
+
+# one table is shared by the whole compiler, so the IDs below can be used everywhere
+SYMBOLS = SymbolTable()
+intern = SYMBOLS.intern
+
+# keywords
+IF = intern("if")
+THEN = intern("then")
+ELSE = intern("else")
+WHILE = intern("while")
+DO = intern("do")
+VAR = intern("var")
+TRUE = intern("true")
+FALSE = intern("false")
+
+# operators
+PLUS = intern("+")
+MINUS = intern("-")
+TIMES = intern("*")
+DIVIDE = intern("/")
+MODULO = intern("%")
+ASSIGN = intern("=")
+EQUAL = intern("==")
+NOT_EQUAL = intern("!=")
+LESS = intern("<")
+LESS_EQUAL = intern("<=")
+GREATER = intern(">")
+GREATER_EQUAL = intern(">=")
+AND = intern("and")
+OR = intern("or")
+NOT = intern("not")
+
+# punctuation
+LEFT_PAREN = intern("(")
+RIGHT_PAREN = intern(")")
+LEFT_BRACE = intern("{")
+RIGHT_BRACE = intern("}")
+COMMA = intern(",")
+SEMICOLON = intern(";")
+COLON = intern(":")
+
+# names the type checker and interpreter give to unary operators and built-in functions
+UNARY_NOT = intern("unary_not")
+UNARY_MINUS = intern("unary_-")
+PRINT_INT = intern("print_int")
+PRINT_BOOL = intern("print_bool")
+READ_INT = intern("read_int")
@@ -1,98 +1,519 @@
-from dataclasses import dataclass
+from array import array
+import codecs
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from functools import cached_property
+from mmap import ACCESS_READ, mmap
+import os
 import re
-from typing import Literal
+from typing import IO, Any, Iterator, Literal, cast, overload
 
+from compiler.symbols import NO_SYMBOL, SYMBOLS
 
-@dataclass(frozen=True)
+# bytes-like source code is tokenized with a bytes regex without decoding it first, e.g. straight
+# from a memory-mapped file. It has to be ASCII.
+type SourceCode = str | bytes | memoryview | mmap
+
+
+class LineIndex:
+    """Start positions of the lines of a source code, for finding the line and column of a
+    position on demand.
+
+    `first_line` is the line number of source_code[0]; iter_tokens indexes the source one
+    chunk at a time and the chunks don't start on line 0.
+    """
+
+    def __init__(self, source_code: SourceCode, first_line: int = 0) -> None:
+        newline: Any = "\n" if isinstance(source_code, str) else b"\n"
+        self.first_line = first_line
+        self.line_starts = array("q", [0])
+        self.line_starts.extend(m.end() for m in re.finditer(newline, source_code))
+        # positions in bytes-like source code are byte offsets, columns count characters
+        self.encoded = None if isinstance(source_code, str) else source_code
+
+    def line_and_column(self, position: int) -> tuple[int, int]:
+        line = bisect_right(self.line_starts, position) - 1
+        column = position - self.line_starts[line]
+        if self.encoded is not None:
+            prefix = bytes(self.encoded[self.line_starts[line] : position])
+            if not prefix.isascii():
+                column = len(str(prefix, "utf-8", "replace"))
+        return self.first_line + line, column
+
+
+@dataclass(frozen=True, slots=True)
 class Location:
+    """Line and column of a position in the source code.
+
+    Locations made by the tokenizer are created with Location.at() and only store the position
+    and the LineIndex of the source. The line and column are looked up the first time they
+    are read, which for most tokens and AST nodes is never.
+    """
+
     column: int
     line: int
+    _line_index: LineIndex = field(init=False, repr=False, compare=False)
+    _position: int = field(init=False, repr=False, compare=False)
+
+    @classmethod
+    def at(cls, line_index: LineIndex, position: int) -> "Location":
+        location = object.__new__(cls)
+        object.__setattr__(location, "_line_index", line_index)
+        object.__setattr__(location, "_position", position)
+        return location
+
+    def __getattr__(self, name: str) -> int:
+        # only called for unset slots, i.e. the line and column of a lazy location
+        if name != "line" and name != "column":
+            raise AttributeError(name)
+        line, column = self._line_index.line_and_column(self._position)
+        object.__setattr__(self, "line", line)
+        object.__setattr__(self, "column", column)
+        return line if name == "line" else column
+
+    def __reduce__(self) -> tuple[type["Location"], tuple[int, int]]:
+        return Location, (self.column, self.line)
 
 
 TokenType = Literal["int_literal", "identifier", "operator", "punctuation", "end"]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Token:
     type: TokenType
     text: str
     location: Location
+    # ID of the text in compiler.symbols.SYMBOLS. Looked up from the text the first time it's
+    # read, so tokens that are never parsed don't pay for interning. Integer literals have no
+    # symbol.
+    symbol: int = field(init=False, compare=False, repr=False)
+
+    def __getattr__(self, name: str) -> int:
+        # only called for the unset symbol slot
+        if name != "symbol":
+            raise AttributeError(name)
+        symbol = NO_SYMBOL if self.type == "int_literal" else SYMBOLS.intern(self.text)
+        object.__setattr__(self, "symbol", symbol)
+        return symbol
+
+
+# index == type code used in TokenBuffer
+TOKEN_TYPES: tuple[TokenType, ...] = (
+    "int_literal",
+    "identifier",
+    "operator",
+    "punctuation",
+    "end",
+)
+_TYPE_CODES = {token_type: code for code, token_type in enumerate(TOKEN_TYPES)}
+
+
+class TokenBuffer(Sequence[Token]):
+    """Tokens of one source code stored column-wise in arrays instead of as Token objects.
+
+    Token texts are sliced out of the source code only when asked for. Indexing returns a
+    Token built on the fly, so a TokenBuffer can be used wherever a list of tokens is expected;
+    type(), text() and location() read a single column without building the whole Token.
+    """
+
+    def __init__(self, source_code: SourceCode) -> None:
+        self.source_code = source_code
+        self.types = array("B")
+        self.starts = array("q")
+        self.ends = array("q")
+        self.symbols = array("l")
+
+    @cached_property
+    def line_index(self) -> LineIndex:
+        return LineIndex(self.source_code)
+
+    def append(self, type: TokenType, start: int, end: int) -> None:
+        self.types.append(_TYPE_CODES[type])
+        self.starts.append(start)
+        self.ends.append(end)
+        self.symbols.append(
+            NO_SYMBOL if type == "int_literal" else SYMBOLS.intern(self.text(-1))
+        )
+
+    def type(self, index: int) -> TokenType:
+        return TOKEN_TYPES[self.types[index]]
+
+    def text(self, index: int) -> str:
+        text = self.source_code[self.starts[index] : self.ends[index]]
+        return text if isinstance(text, str) else str(text, "ascii")
+
+    def location(self, index: int) -> Location:
+        return Location.at(self.line_index, self.starts[index])
+
+    def symbol(self, index: int) -> int:
+        return self.symbols[index]
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    @overload
+    def __getitem__(self, index: int) -> Token: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[Token]: ...
+
+    def __getitem__(self, index: int | slice) -> Token | list[Token]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        token = Token(
+            type=self.type(index),
+            text=self.text(index),
+            location=self.location(index),
+        )
+        object.__setattr__(token, "symbol", self.symbols[index])
+        return token
 
 
 # Operators: +, -, *, /, =, ==, !=, <, <=, >, >=
 # this still allows things like test- to pass as identifiers, which should be two tokens: test and -
-def tokenize(source_code: str) -> list[Token]:
-    newline_re = re.compile(r"\n")
-    whitespace_re = re.compile(r"\s")
-    comment_re = re.compile(r"(//|#).*\n")
+#
+# All token patterns are combined into one regex so that every token is found with a single
+# match, together with the comments and whitespace before it. The alternatives are in the order
+# the patterns used to be tried one by one, so the first alternative that matches at a position
+# still wins. "error" matches any character nothing else does and "eof" the end of the source,
+# which means the matches cover the whole source and finditer can be used to walk it.
+_TOKEN_RE = re.compile(
+    r"(?:(?://|#).*\n|\s+)*"
+    r"(?:(?P<operator>==|<=|>=|!=|\+|-|\*|/|=|>|<|%|not|and|or)"
     # maybe \b shouldnt be at the start? might break something later
-    identifier_re = re.compile(r"\b[A-Za-z_][A-Za-z_0-9]*")
-    integer_literal_re = re.compile(r"[0-9]+")
-    operator_re = re.compile(r"(==|<=|>=|!=|\+|-|\*|/|=|>|<|%|not|and|or)")
-    punctuation_re = re.compile(r"[(){},;:]")
-
-    position = 0
-    # the current column is position - column_start_pos
-    # column_start_pos == where column 0 is on the current line, as a position value
-    column_start_pos = 0
+    r"|(?P<identifier>\b[A-Za-z_][A-Za-z_0-9]*)"
+    r"|(?P<int_literal>[0-9]+)"
+    r"|(?P<punctuation>[(){},;:])"
+    r"|(?P<error>.)"
+    r"|(?P<eof>\Z))"
+)
+# the same for bytes, with \s spelled out as the characters it matches in str patterns
+_BYTES_TOKEN_RE = re.compile(
+    _TOKEN_RE.pattern.replace(r"\s", r"[\t-\r\x1c-\x20]").encode()
+)
+
+
+def tokenize(source_code: str) -> list[Token]:
+    line_index = LineIndex(source_code)
+    return [
+        Token(
+            type=kind,
+            text=source_code[start:end],
+            location=Location.at(line_index, start),
+        )
+        for kind, start, end in _scan(source_code, 0, len(source_code))
+    ]
+
+
+def tokenize_to_buffer(source_code: SourceCode) -> TokenBuffer:
+    buffer = TokenBuffer(source_code)
+    _fill_columns(
+        source_code,
+        _scan(source_code, 0, len(source_code)),
+        buffer.types,
+        buffer.starts,
+        buffer.ends,
+        buffer.symbols,
+        SYMBOLS.ids,
+        SYMBOLS.intern,
+    )
+    return buffer
+
+
+def _fill_columns(
+    source_code: SourceCode,
+    spans: Iterator[tuple[TokenType, int, int]],
+    types: "array[int]",
+    starts: "array[int]",
+    ends: "array[int]",
+    symbols: "array[int]",
+    ids: dict[str, int],
+    intern: Callable[[str], int],
+    offset: int = 0,
+) -> None:
+    """Append the tokens found by _scan to the columns of a TokenBuffer, interning their texts
+    with `intern` and moving their positions by `offset`.
+
+    `ids` is the table `intern` adds to. Almost every name is in it already, so it's read
+    directly and `intern` is only called for new names.
+    """
+    append_type = types.append
+    append_start = starts.append
+    append_end = ends.append
+    append_symbol = symbols.append
+    lookup = ids.get
+    for kind, start, end in spans:
+        append_type(_TYPE_CODES[kind])
+        append_start(offset + start)
+        append_end(offset + end)
+        if kind == "int_literal":
+            append_symbol(NO_SYMBOL)
+        else:
+            text = source_code[start:end]
+            if not isinstance(text, str):
+                text = str(text, "ascii")
+            symbol = lookup(text)
+            append_symbol(intern(text) if symbol is None else symbol)
+
+
+def tokenize_file(path: str) -> TokenBuffer:
+    """Tokenize a file by memory-mapping it instead of reading it into a string.
+
+    The returned buffer keeps the mapping open and token texts are decoded from it only when
+    they are asked for, so the source code is never copied as a whole.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # empty files can't be mapped
+            return tokenize_to_buffer(b"")
+        return tokenize_to_buffer(mmap(f.fileno(), 0, access=ACCESS_READ))
+
+
+def iter_tokens(stream: IO[str] | IO[bytes], chunk_size: int = 65536) -> Iterator[Token]:
+    """Tokenize a text or binary file object lazily, `chunk_size` characters or bytes at a time.
+
+    Tokens and comments never continue past a newline, so everything up to the last newline read
+    so far can be tokenized on its own and only the unfinished last line is carried over to the
+    next chunk. Memory use is bounded by the chunk size and the longest line of the source.
+    Binary streams are decoded as UTF-8.
+    """
+    decoder: codecs.IncrementalDecoder | None = None
+    pending = ""
+    # line number and absolute position of pending[0]
     line = 0
+    offset = 0
+
+    def tokens_until(endpos: int) -> Iterator[Token]:
+        line_index = LineIndex(pending[:endpos], line)
+        for kind, start, end in _scan(pending, 0, endpos, offset, line):
+            yield Token(
+                type=kind,
+                text=pending[start:end],
+                location=Location.at(line_index, start),
+            )
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder("utf-8")()
+            pending += decoder.decode(chunk, final=not chunk)
+        else:
+            pending += chunk
+
+        if not chunk:
+            yield from tokens_until(len(pending))
+            return
+
+        end = pending.rfind("\n") + 1
+        if end > 0:
+            yield from tokens_until(end)
+            line += pending.count("\n", 0, end)
+            offset += end
+            pending = pending[end:]
+
+
+# Below this many characters tokenize_parallel doesn't start a process pool. Measured by
+# benchmarks/tokenizer_parallel.py (baselines/tokenizer_parallel.json): the pool costs ~6 ms
+# to start and sending the chunks and token arrays ~20% of the tokenizing time, so two workers
+# break even at about 0.10 MB. This is that crossover rounded up to a power of two.
+PARALLEL_THRESHOLD = 128 * 1024
+
+
+def tokenize_parallel(
+    source_code: str,
+    workers: int | None = None,
+    threshold: int = PARALLEL_THRESHOLD,
+) -> TokenBuffer:
+    """Tokenize a big source code in chunks on a process pool.
+
+    The source is split at line starts, which are safe places to start tokenizing from since
+    neither tokens nor comments continue past a newline. Each worker returns the token arrays
+    of its chunk with positions already moved to where the chunk is in the whole source, so
+    stitching them together needs no other corrections; lines are looked up from the positions
+    by the buffer's LineIndex as usual.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if len(source_code) < threshold or workers < 2:
+        return tokenize_to_buffer(source_code)
+
+    chunk_size = len(source_code) // workers + 1
+    boundaries = [0]
+    for i in range(1, workers):
+        boundary = source_code.find("\n", max(i * chunk_size, boundaries[-1])) + 1
+        if boundary == 0:
+            break
+        boundaries.append(boundary)
+    boundaries.append(len(source_code))
+
+    chunks = [(source_code[start:end], start) for start, end in zip(boundaries, boundaries[1:])]
+
+    buffer = TokenBuffer(source_code)
+    with ProcessPoolExecutor(workers) as executor:
+        for types, starts, ends, symbols, names in executor.map(
+            _tokenize_chunk, chunks
+        ):
+            buffer.types += types
+            buffer.starts += starts
+            buffer.ends += ends
+            # the workers have their own symbol tables
+            symbol_ids = {i: SYMBOLS.intern(name) for i, name in enumerate(names)}
+            symbol_ids[NO_SYMBOL] = NO_SYMBOL
+            buffer.symbols += array("l", map(symbol_ids.__getitem__, symbols))
+    return buffer
 
-    tokens: list[Token] = []
 
-    def regexMatch(pattern: re.Pattern[str], type: TokenType) -> bool:
-        nonlocal position
+def _tokenize_chunk(
+    chunk: tuple[str, int],
+) -> tuple["array[int]", "array[int]", "array[int]", "array[int]", list[str]]:
+    """Worker function of tokenize_parallel. Symbols are numbered locally, in the order of the
+    returned list of names."""
+    source_code, offset = chunk
+    types = array("B")
+    starts = array("q")
+    ends = array("q")
+    symbols = array("l")
+    local_ids: dict[str, int] = {}
 
-        match = pattern.match(source_code, position)
-        if match is not None:
-            tokens.append(
-                Token(
-                    type=type,
-                    text=source_code[position : match.end()],
-                    location=Location(column=position - column_start_pos, line=line),
+    def intern(name: str) -> int:
+        return local_ids.setdefault(name, len(local_ids))
+
+    spans = _scan(source_code, 0, len(source_code), offset)
+    _fill_columns(source_code, spans, types, starts, ends, symbols, local_ids, intern, offset)
+    return types, starts, ends, symbols, list(local_ids)
+
+
+@dataclass(frozen=True)
+class TokenEdit:
+    """Result of retokenize: tokens[start:old_end] of the old buffer were replaced by
+    tokens[start:new_end] of the new one. The tokens after them are the same as before,
+    moved by `shift` positions in the source code."""
+
+    start: int
+    old_end: int
+    new_end: int
+    shift: int
+
+
+def retokenize(
+    tokens: TokenBuffer, position: int, removed: int, inserted: str
+) -> tuple[TokenBuffer, TokenEdit]:
+    """Tokenize the source code of `tokens` after replacing `removed` characters at `position`
+    with `inserted`.
+
+    Only the edited region is scanned again: scanning starts from the line of the edit and stops
+    at the first token after it that is also in the old buffer, at the same place relative to
+    the end of the edit. Since scanning only depends on the text from the current position
+    onwards (and one character before it, for the \\b of identifiers), the rest of the tokens
+    are guaranteed to be the same and are only shifted.
+    """
+    old_source = tokens.source_code
+    if not isinstance(old_source, str):
+        raise TypeError("retokenize only supports token buffers over a str")
+    source_code = old_source[:position] + inserted + old_source[position + removed :]
+    shift = len(inserted) - removed
+    edit_end = position + len(inserted)
+
+    # tokens before the edit may continue into it ("=" followed by an inserted "=") and an
+    # edit may turn the rest of a line into a comment or back, so the whole line is scanned
+    scan_from = old_source.rfind("\n", 0, position) + 1
+    start = bisect_left(tokens.starts, scan_from)
+    old_end = len(tokens)
+
+    buffer = TokenBuffer(source_code)
+    buffer.types = tokens.types[:start]
+    buffer.starts = tokens.starts[:start]
+    buffer.ends = tokens.ends[:start]
+    buffer.symbols = tokens.symbols[:start]
+
+    old_index = start
+    for kind, token_start, token_end in _scan(
+        source_code, scan_from, len(source_code)
+    ):
+        old_start = token_start - shift
+        if token_start >= edit_end and (
+            source_code[token_start - 1 : token_start]
+            == old_source[old_start - 1 : old_start]
+        ):
+            old_index = bisect_left(tokens.starts, old_start, old_index)
+            if (
+                old_index < len(tokens)
+                and tokens.starts[old_index] == old_start
+                and tokens.ends[old_index] == token_end - shift
+                and tokens.types[old_index] == _TYPE_CODES[kind]
+            ):
+                old_end = old_index
+                break
+        buffer.append(kind, token_start, token_end)
+
+    new_end = len(buffer)
+    buffer.types += tokens.types[old_end:]
+    buffer.symbols += tokens.symbols[old_end:]
+    if shift == 0:
+        buffer.starts += tokens.starts[old_end:]
+        buffer.ends += tokens.ends[old_end:]
+    else:
+        buffer.starts += array("q", map(shift.__add__, tokens.starts[old_end:]))
+        buffer.ends += array("q", map(shift.__add__, tokens.ends[old_end:]))
+
+    return buffer, TokenEdit(start, old_end, new_end, shift)
+
+
+def _scan(
+    source_code: SourceCode,
+    pos: int,
+    endpos: int,
+    offset: int = 0,
+    first_line: int = 0,
+) -> Iterator[tuple[TokenType, int, int]]:
+    """Find the tokens of source_code[pos:endpos] as (type, start, end) tuples.
+
+    `offset` is the position and `first_line` the line number of source_code[0] in the whole
+    source, used in error messages.
+    """
+    pattern: re.Pattern[Any] = (
+        _TOKEN_RE if isinstance(source_code, str) else _BYTES_TOKEN_RE
+    )
+    while True:
+        for match in pattern.finditer(source_code, pos, endpos):
+            kind = match.lastgroup or "eof"
+            position, end = match.span(kind)
+
+            if kind == "error":
+                if isinstance(source_code, str):
+                    character = source_code[position]
+                else:
+                    character = _decode_character(source_code, position)
+                    if character.isspace():
+                        # the bytes pattern only skips ASCII whitespace, the str one skips all
+                        pos = position + len(character.encode())
+                        break
+                    if not character.isascii():
+                        location = Location.at(LineIndex(source_code, first_line), position)
+                        raise Exception(f"{location}: non-ASCII character in source code")
+                raise Exception(
+                    "No match found, position: ",
+                    offset + position,
+                    ", source code at position: ",
+                    character,
                 )
-            )
-            position = match.end()
-            return True
-        return False
-
-    while position < len(source_code):
-
-        match = comment_re.match(source_code, position)
-        if match is not None:
-            position = match.end()
-            column_start_pos = match.end()
-            line += 1
-            continue
-
-        match = newline_re.match(source_code, position)
-        if match is not None:
-            position = match.end()
-            column_start_pos = match.end()
-            line += 1
-            continue
-
-        match = whitespace_re.match(source_code, position)
-        if match is not None:
-            position = match.end()
-            continue
-
-        if regexMatch(operator_re, "operator"):
-            continue
-
-        if regexMatch(identifier_re, "identifier"):
-            continue
-
-        if regexMatch(integer_literal_re, "int_literal"):
-            continue
-
-        if regexMatch(punctuation_re, "punctuation"):
-            continue
-
-        raise Exception(
-            "No match found, position: ",
-            position,
-            ", source code at position: ",
-            source_code[position],
-        )
+            elif kind != "eof":
+                yield cast(TokenType, kind), position, end
+        else:
+            return
+
 
-    return tokens
+def _decode_character(source_code: bytes | memoryview | mmap, position: int) -> str:
+    """Decode the UTF-8 character at source_code[position] without decoding the rest."""
+    # UTF-8 characters are at most 4 bytes long
+    head = bytes(source_code[position : position + 4])
+    for length in range(1, len(head) + 1):
+        try:
+            return str(head[:length], "utf-8")
+        except UnicodeDecodeError:
+            pass
+    return "\ufffd"
@@ -1,190 +1,236 @@
 from dataclasses import dataclass
+from typing import cast
 import compiler.ast as ast
+from compiler.symbols import (
+    AND,
+    ASSIGN,
+    DIVIDE,
+    EQUAL,
+    GREATER,
+    GREATER_EQUAL,
+    LESS,
+    LESS_EQUAL,
+    MINUS,
+    MODULO,
+    NOT,
+    NOT_EQUAL,
+    OR,
+    PLUS,
+    PRINT_BOOL,
+    PRINT_INT,
+    READ_INT,
+    TIMES,
+    UNARY_MINUS,
+    UNARY_NOT,
+)
 from compiler.types import *
 
+# unary operators are typed under their own names, since "-" is also a binary operator
+UNARY_OPERATORS = {NOT: UNARY_NOT, MINUS: UNARY_MINUS}
+
 
 @dataclass
 class SymTab:
-    locals: dict[str, Type]
+    # keys are symbol IDs, see compiler.symbols
+    locals: dict[int, Type]
     parent: "SymTab" = None
 
 
-def typecheck(node: ast.Expression, sym_tab: SymTab = None) -> Type:
-    current_tab: SymTab = SymTab({}, sym_tab)
+# types are interned, so the same objects are shared by every top-level scope
+_TOP_LEVEL_TYPES: dict[int, Type] = {}
+for arithmetic_op in [PLUS, MINUS, TIMES, DIVIDE, MODULO]:
+    _TOP_LEVEL_TYPES[arithmetic_op] = FunType((Int, Int), Int)
 
-    def add_symbol_type(node: ast.VariableDeclaration):
-        symbol_type = typecheck(node.initializer, current_tab)
-        if node.declared_type is not None and node.declared_type != symbol_type:
-            raise Exception(
-                f"{node.location}. Type check error: declared type of a variable does not match type checked type"
-            )
+for comparison_op in [LESS, LESS_EQUAL, GREATER, GREATER_EQUAL]:
+    _TOP_LEVEL_TYPES[comparison_op] = FunType((Int, Int), Bool)
 
-        current_tab.locals[node.name] = symbol_type
+_TOP_LEVEL_TYPES[OR] = FunType((Bool, Bool), Bool)
+_TOP_LEVEL_TYPES[AND] = FunType((Bool, Bool), Bool)
 
-    def add_top_level_func_types() -> None:
-        for arithmetic_op in ["+", "-", "*", "/", "%"]:
-            current_tab.locals[arithmetic_op] = FunType(
-                [
-                    Int,
-                    Int,
-                ],
-                Int,
-            )
+_TOP_LEVEL_TYPES[UNARY_NOT] = FunType((Bool,), Bool)
+_TOP_LEVEL_TYPES[UNARY_MINUS] = FunType((Int,), Int)
+
+_TOP_LEVEL_TYPES[PRINT_INT] = FunType((Int,), Unit)
+_TOP_LEVEL_TYPES[PRINT_BOOL] = FunType((Bool,), Unit)
+_TOP_LEVEL_TYPES[READ_INT] = FunType((Int,), Unit)
 
-        for comparison_op in ["<", "<=", ">", ">="]:
-            current_tab.locals[comparison_op] = FunType([Int, Int], Bool)
 
-        current_tab.locals["or"] = FunType([Bool, Bool], Bool)
-        current_tab.locals["and"] = FunType([Bool, Bool], Bool)
+def _add_top_level_func_types(tab: SymTab) -> None:
+    tab.locals.update(_TOP_LEVEL_TYPES)
 
-        current_tab.locals["unary_not"] = FunType([Bool], Bool)
-        current_tab.locals["unary_-"] = FunType([Int], Int)
 
-        current_tab.locals["print_int"] = FunType([Int], Unit)
-        current_tab.locals["print_bool"] = FunType([Bool], Unit)
-        current_tab.locals["read_int"] = FunType([Int], Unit)
+def _get_symbol_type(symbol: int, tab: SymTab) -> Type:
+    if symbol in tab.locals.keys():
+        return tab.locals[symbol]
 
-    def get_symbol_type(symbol: str, tab: SymTab = current_tab) -> Type:
-        if symbol in tab.locals.keys():
-            return tab.locals[symbol]
+    if tab.parent is not None:
+        return _get_symbol_type(symbol, tab.parent)
 
-        if tab.parent is not None:
-            return get_symbol_type(symbol, tab.parent)
+    return None
 
-        return None
 
+def typecheck(node: ast.Expression, sym_tab: SymTab = None) -> Type:
     if sym_tab is None:
-        add_top_level_func_types()
+        sym_tab = _top_level_tab()
+    return _TYPE_CHECKER.visit(node, sym_tab)
 
-    match node:
 
-        case ast.Literal():
-            if isinstance(node.value, bool):
-                return Bool
-            elif isinstance(node.value, int):
-                return Int
-            else:
-                raise Exception(
-                    f"{node.location}. Type check error: unexpected type in literal: {type(node.value)}"
-                )
+def _top_level_tab() -> SymTab:
+    tab = SymTab({})
+    _add_top_level_func_types(tab)
+    return tab
 
-        case ast.VariableDeclaration():
-            add_symbol_type(node)
-            return Unit
 
-        case ast.UnaryOp():
-            t2 = typecheck(node.right, current_tab)
+class TypeChecker(ast.Visitor[Type]):
+    """The visit methods return the type of a node, and take the symbol table of the scope
+    that the node is in. Blocks are the only nodes that declare variables, so they're the
+    only ones with a scope of their own."""
 
-            func_type: FunType = get_symbol_type("unary_" + node.op)
+    # checks the initializer of a variable and returns the type of the variable
+    def variable_type(self, node: ast.VariableDeclaration, tab: SymTab) -> Type:
+        symbol_type = self.visit(node.initializer, tab)
+        if node.declared_type is not None and node.declared_type is not symbol_type:
+            raise Exception(
+                f"{node.location}. Type check error: declared type of a variable does not match type checked type"
+            )
+        return symbol_type
+
+    def visit_Literal(self, node: ast.Literal, tab: SymTab) -> Type:
+        if isinstance(node.value, bool):
+            return Bool
+        elif isinstance(node.value, int):
+            return Int
+        else:
+            raise Exception(
+                f"{node.location}. Type check error: unexpected type in literal: {type(node.value)}"
+            )
 
-            if [t2] != func_type.argument_types:
-                raise Exception(
-                    f"{node.location}. Type check error: value in unary operation was not bool, {t2}"
-                )
+    # the variable would only be visible in a scope of its own, which ends right away
+    def visit_VariableDeclaration(self, node: ast.VariableDeclaration, tab: SymTab) -> Type:
+        self.variable_type(node, tab)
+        return Unit
 
-            return func_type.return_type
+    def visit_UnaryOp(self, node: ast.UnaryOp, tab: SymTab) -> Type:
+        t2 = self.visit(node.right, tab)
 
-        case ast.While():
-            cond_type = typecheck(node.cond, current_tab)
-            if cond_type is not Bool:
-                raise Exception(
-                    f"{node.location}. Type check error: condition of while-loop was not bool, {cond_type}"
-                )
+        func_type = cast(FunType, _get_symbol_type(UNARY_OPERATORS[node.symbol], tab))
 
-            typecheck(node.body, current_tab)
+        if t2 is not func_type.argument_types[0]:
+            raise Exception(
+                f"{node.location}. Type check error: value in unary operation was not bool, {t2}"
+            )
 
-            return Unit
+        return func_type.return_type
 
-        case ast.Identifier():
-            identifier_type = get_symbol_type(node.name)
-            if identifier_type is None:
-                raise Exception(
-                    f"{node.location}. Type check error: could not find type for symbol {node.name}"
-                )
+    def visit_While(self, node: ast.While, tab: SymTab) -> Type:
+        cond_type = self.visit(node.cond, tab)
+        if cond_type is not Bool:
+            raise Exception(
+                f"{node.location}. Type check error: condition of while-loop was not bool, {cond_type}"
+            )
 
-            if isinstance(identifier_type, FunType):
-                return identifier_type.return_type
-            elif isinstance(identifier_type, BasicType):
-                return identifier_type
-            else:
-                raise Exception(
-                    f"{node.location}. Type check error: unsupported type declared as variable, {type(identifier_type)}"
-                )
+        self.visit(node.body, tab)
 
-        case ast.Block():
-            for expr in node.statements:
-                if isinstance(expr, ast.VariableDeclaration):
-                    add_symbol_type(expr)
-                else:
-                    # everything is checked for type errors even though doesnt matter for block evaluation
-                    typecheck(expr, current_tab)
+        return Unit
 
-            if isinstance(node.result, ast.Literal) and node.result.value is None:
-                return Unit
-            # node.result is None when the node is an empty block
-            elif node.result is None:
-                return Unit
-            else:
-                return typecheck(node.result, current_tab)
-
-        case ast.BinaryOp():
-            t1 = typecheck(node.left, current_tab)
-            t2 = typecheck(node.right, current_tab)
-
-            func_type: FunType = None
-
-            # separately handling operators where both values should have same type (of any type)
-            if node.op in ["=", "==", "!="]:
-                if t1 != t2:
-                    raise Exception(
-                        f"{node.location}. Type check error: two values of binary operation had different types, {t1, t2}"
-                    )
-                if node.op == "=":
-                    return Unit
-                return Bool
+    def visit_Identifier(self, node: ast.Identifier, tab: SymTab) -> Type:
+        identifier_type = _get_symbol_type(node.symbol, tab)
+        if identifier_type is None:
+            raise Exception(
+                f"{node.location}. Type check error: could not find type for symbol {node.name}"
+            )
+
+        if isinstance(identifier_type, FunType):
+            return identifier_type.return_type
+        elif isinstance(identifier_type, BasicType):
+            return identifier_type
+        else:
+            raise Exception(
+                f"{node.location}. Type check error: unsupported type declared as variable, {type(identifier_type)}"
+            )
+
+    def visit_Block(self, node: ast.Block, tab: SymTab) -> Type:
+        block_tab = SymTab({}, tab)
+        for expr in node.statements:
+            if isinstance(expr, ast.VariableDeclaration):
+                block_tab.locals[expr.symbol] = self.variable_type(expr, block_tab)
             else:
-                func_type = get_symbol_type(node.op)
+                # everything is checked for type errors even though doesnt matter for block evaluation
+                self.visit(expr, block_tab)
 
-            if func_type is None:
-                raise Exception(
-                    f"{node.location}. Type check error: unsupported BinaryOp, {node.op}"
-                )
+        if isinstance(node.result, ast.Literal) and node.result.value is None:
+            return Unit
+        # node.result is None when the node is an empty block
+        elif node.result is None:
+            return Unit
+        else:
+            return self.visit(node.result, block_tab)
+
+    def visit_BinaryOp(self, node: ast.BinaryOp, tab: SymTab) -> Type:
+        t1 = self.visit(node.left, tab)
+        t2 = self.visit(node.right, tab)
 
-            if [t1, t2] != func_type.argument_types:
+        func_type: FunType | None = None
+
+        # separately handling operators where both values should have same type (of any type)
+        if node.symbol in (ASSIGN, EQUAL, NOT_EQUAL):
+            if t1 is not t2:
                 raise Exception(
-                    f"{node.location}. Type check error: expected BinaryOp argument types {func_type.argument_types}, received {t1, t2}"
+                    f"{node.location}. Type check error: two values of binary operation had different types, {t1, t2}"
                 )
+            if node.symbol == ASSIGN:
+                return Unit
+            return Bool
+        else:
+            # operators are always declared with a FunType, or not at all
+            func_type = cast(FunType | None, _get_symbol_type(node.symbol, tab))
+
+        if func_type is None:
+            raise Exception(
+                f"{node.location}. Type check error: unsupported BinaryOp, {node.op}"
+            )
+
+        argument_types = func_type.argument_types
+        if t1 is not argument_types[0] or t2 is not argument_types[1]:
+            raise Exception(
+                f"{node.location}. Type check error: expected BinaryOp argument types {list(func_type.argument_types)}, received {t1, t2}"
+            )
 
-            return func_type.return_type
+        return func_type.return_type
 
-        case ast.FunctionCall():
-            func_type = get_symbol_type(node.name)
+    def visit_FunctionCall(self, node: ast.FunctionCall, tab: SymTab) -> Type:
+        func_type = cast(FunType, _get_symbol_type(node.symbol, tab))
 
-            expr_types: list[Type] = []
-            for expr in node.arguments:
-                expr_types.append(typecheck(expr))
+        # the arguments are checked in a new top-level scope, without the variables
+        expr_types = tuple(self.visit(expr, _top_level_tab()) for expr in node.arguments)
 
-            if expr_types != func_type.argument_types:
-                raise Exception(
-                    f"{node.location}. Type check error: types of function arguments do not match expected types"
-                )
+        if expr_types != func_type.argument_types:
+            raise Exception(
+                f"{node.location}. Type check error: types of function arguments do not match expected types"
+            )
 
-            return Unit
+        return Unit
 
-        case ast.Conditional():
-            t1 = typecheck(node.cond_if, current_tab)
+    def visit_Conditional(self, node: ast.Conditional, tab: SymTab) -> Type:
+        t1 = self.visit(node.cond_if, tab)
 
-            if t1 is not Bool:
-                raise Exception(
-                    f"{node.location}. Type check error: type of if-clause's condition was not boolean, was {type(node.cond_if)}"
-                )
+        if t1 is not Bool:
+            raise Exception(
+                f"{node.location}. Type check error: type of if-clause's condition was not boolean, was {type(node.cond_if)}"
+            )
 
-            t2 = typecheck(node.then, current_tab)
-            t3 = typecheck(node.cond_else, current_tab)
+        t2 = self.visit(node.then, tab)
+        # a missing else has no type
+        t3 = None
+        if node.cond_else is not None:
+            t3 = self.visit(node.cond_else, tab)
+
+        if t2 is not t3:
+            raise Exception(
+                f"{node.location}. Type check error: if-clause's then and else had differing types, {t2, t3}"
+            )
+
+        return t2
 
-            if t2 != t3:
-                raise Exception(
-                    f"{node.location}. Type check error: if-clause's then and else had differing types, {t2, t3}"
-                )
 
-            return t2
+_TYPE_CHECKER = TypeChecker()
@@ -1,22 +1,59 @@
-from dataclasses import dataclass
+from collections.abc import Iterable
+from dataclasses import dataclass, fields
+from typing import Any, TypeVar
 
+T = TypeVar("T", bound="Type")
 
-@dataclass(frozen=True)
+
+# Types are interned: constructing a type that exists already returns the existing object, so
+# types are compared and hashed by identity and can be used as dict keys.
+@dataclass(frozen=True, eq=False, init=False, slots=True)
 class Type:
     "Base class"
 
+    # unpickled through the constructor, so the result is the interned object
+    def __reduce__(self) -> tuple[type, tuple[Any, ...]]:
+        return type(self), tuple(getattr(self, f.name) for f in fields(self))
+
+
+class TypeTable:
+    """Maps the fields of every type to the one object of that type."""
+
+    def __init__(self) -> None:
+        self.types: dict[tuple[Any, ...], Type] = {}
+
+    def intern(self, cls: type[T], *values: Any) -> T:
+        key = (cls, *values)
+        interned = self.types.get(key)
+        if interned is None:
+            interned = object.__new__(cls)
+            for f, value in zip(fields(cls), values):
+                object.__setattr__(interned, f.name, value)
+            self.types[key] = interned
+        return interned  # type: ignore[return-value]
 
-@dataclass(frozen=True)
+
+# one table is shared by the whole compiler, like compiler.symbols.SYMBOLS
+TYPES = TypeTable()
+
+
+@dataclass(frozen=True, eq=False, init=False, slots=True)
 class BasicType(Type):
     name: str
 
+    def __new__(cls, name: str) -> "BasicType":
+        return TYPES.intern(cls, name)
+
 
 Int = BasicType("Int")
 Bool = BasicType("Bool")
 Unit = BasicType("Unit")
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False, init=False, slots=True)
 class FunType(Type):
-    argument_types: list[Type]
+    argument_types: tuple[Type, ...]
     return_type: Type
+
+    def __new__(cls, argument_types: Iterable[Type], return_type: Type) -> "FunType":
+        return TYPES.intern(cls, tuple(argument_types), return_type)
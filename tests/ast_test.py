@@ -0,0 +1,142 @@
+import pickle
+from compiler.tokenizer import Location, tokenize
+from compiler.parser import parse
+from compiler.symbols import SYMBOLS
+from tests.tokenizer_test import L
+import compiler.ast as ast
+from compiler.types import BasicType
+
+SOURCE_CODE = (
+    "var x: Int = 1; {} { a; } if a then b; if x < 2 then { f(-x, not y) } else 3;"
+    " while true do x = x + 1; { x }"
+)
+
+
+def test_arena_round_trips_trees() -> None:
+    tree = parse(tokenize(SOURCE_CODE))
+    arena = ast.Arena()
+    other = arena.add(parse(tokenize("1 + 2")))
+    root = arena.add(tree)
+
+    assert arena.tree(root) == tree
+    assert arena.tree(other) == parse(tokenize("1 + 2"))
+    assert arena.kind(root) is ast.Block
+    assert [arena.kind(node) for node in arena.statements(root)][:3] == [
+        ast.VariableDeclaration,
+        ast.Block,
+        ast.Block,
+    ]
+    assert arena.tree(arena.result(root)) == ast.Block(L, [], ast.Identifier(L, "x"))
+
+
+def test_arena_walks_subtrees_in_preorder() -> None:
+    arena = ast.Arena()
+    root = arena.add(parse(tokenize("f(1 + x, { y })")))
+
+    assert [arena.kind(node).__name__ for node in arena.walk(root)] == [
+        "FunctionCall",
+        "BinaryOp",
+        "Literal",
+        "Identifier",
+        "Block",
+        "Identifier",
+    ]
+    assert list(arena.walk(arena.child(root, 0))) == [1, 2, 3]
+
+
+def test_arena_maps_symbols_when_unpickled() -> None:
+    arena = ast.Arena()
+    root = arena.add(parse(tokenize("arena_name + 1")))
+    name = arena.child(root, 0)
+    assert pickle.loads(pickle.dumps(arena)).tree(root) == arena.tree(root)
+
+    # as if pickled by a process that numbered the name differently
+    state = arena.__getstate__()
+    state["names"] = {1000: "arena_name", arena.operands[root]: "+"}
+    arena.operands[name] = 1000
+    loaded = object.__new__(ast.Arena)
+    loaded.__setstate__(state)
+    assert loaded.operands[name] == SYMBOLS.intern("arena_name")
+    assert loaded.tree(root) == parse(tokenize("arena_name + 1"))
+
+
+def test_arena_views_read_fields_from_the_arena() -> None:
+    arena = ast.Arena()
+    root = arena.add(parse(tokenize(SOURCE_CODE)))
+    view = arena.view(root)
+
+    assert isinstance(view, ast.Block)
+    declaration, empty, block, conditional = view.statements[:4]
+    assert isinstance(declaration, ast.VariableDeclaration)
+    assert (declaration.name, declaration.declared_type) == ("x", BasicType("Int"))
+    assert declaration.symbol == SYMBOLS.intern("x")
+    assert isinstance(empty, ast.Block) and empty.result is None
+    assert isinstance(block, ast.Block) and block.result is ast.NO_RESULT
+    assert isinstance(conditional, ast.Conditional) and conditional.cond_else is None
+    assert isinstance(conditional.cond_if, ast.Identifier) and conditional.cond_if.location == L
+    assert not hasattr(view, "left")
+
+
+def test_hash_cons_shares_identical_subtrees() -> None:
+    table = ast.HashCons()
+    root = table.share(parse(tokenize("f(x + 1, x + 1, 1, true); x + 1")))
+    assert isinstance(root, ast.Block)
+    call = root.statements[0]
+    assert isinstance(call, ast.FunctionCall) and isinstance(call.arguments[0], ast.BinaryOp)
+
+    assert call.arguments[0] is call.arguments[1] is root.result
+    assert call.arguments[2] is call.arguments[0].right
+    # True == 1, but they're different literals
+    assert call.arguments[3] is not call.arguments[2]
+    assert len(table) == 6
+    assert table.locations(root.result) == [
+        Location(column=4, line=0),
+        Location(column=11, line=0),
+        Location(column=28, line=0),
+    ]
+
+    other = ast.HashCons()
+    assert other.hash(other.share(parse(tokenize("x + 1")))) == table.hash(root.result)
+    assert table.hash(call.arguments[2]) != table.hash(call.arguments[3])
+    # already shared trees are returned as they are
+    assert table.share(root) is root
+    assert len(table.locations(root.result)) == 3
+
+
+class LiteralCount(ast.Visitor[None]):
+    def __init__(self) -> None:
+        self.count = 0
+
+    def visit_Literal(self, node: ast.Literal) -> None:
+        self.count += 1
+
+
+def test_visitor_dispatches_on_node_class() -> None:
+    visitor = LiteralCount()
+    # lazy blocks are visited as blocks, and the generic visit visits the children
+    visitor.visit(parse(tokenize("f(1, 2 + x); { if true then { 3 } }"), lazy=True))
+    assert visitor.count == 4
+
+
+class Increment(ast.Transformer):
+    def visit_Literal(self, node: ast.Literal) -> ast.Expression:
+        if isinstance(node.value, bool):
+            return node
+        return ast.Literal(node.location, node.value + 1)
+
+
+def test_transformer_copies_only_changed_nodes() -> None:
+    tree = parse(tokenize("var x = 1 + y; while true do { f(x) }; 2"))
+    transformed = Increment().visit(tree)
+
+    assert tree == parse(tokenize("var x = 1 + y; while true do { f(x) }; 2"))
+    assert transformed == parse(tokenize("var x = 2 + y; while true do { f(x) }; 3"))
+    assert isinstance(tree, ast.Block) and isinstance(transformed, ast.Block)
+    assert transformed.statements[1] is tree.statements[1]
+    declaration = tree.statements[0]
+    transformed_declaration = transformed.statements[0]
+    assert isinstance(declaration, ast.VariableDeclaration)
+    assert isinstance(transformed_declaration, ast.VariableDeclaration)
+    assert isinstance(declaration.initializer, ast.BinaryOp)
+    assert isinstance(transformed_declaration.initializer, ast.BinaryOp)
+    assert transformed_declaration.initializer.right is declaration.initializer.right
@@ -0,0 +1,59 @@
+from array import array
+import os
+from pathlib import Path
+import pickle
+from compiler.cache import CompilationCache, _dump_tokens, _load_tokens
+from compiler.parser import parse
+from compiler.symbols import NO_SYMBOL, PLUS, SYMBOLS
+from compiler.tokenizer import tokenize_to_buffer
+
+
+def test_cache_returns_the_same_tokens_and_ast_on_a_hit(tmp_path: Path) -> None:
+    source_code = "var x = 1; { x = x + 1; print_int(x) } while x < 3 do x = x * 2"
+    cache = CompilationCache(str(tmp_path))
+
+    assert cache.parse(source_code) == parse(tokenize_to_buffer(source_code))
+    assert cache.stats() == {"hits": 0, "misses": 2}
+
+    # a new process would have a cache of its own
+    cache = CompilationCache(str(tmp_path))
+    tree = cache.parse(source_code)
+    assert tree == parse(tokenize_to_buffer(source_code))
+    assert list(cache.tokenize(source_code)) == list(tokenize_to_buffer(source_code))
+    assert cache.stats() == {"hits": 2, "misses": 0}
+
+    cache.parse(source_code + " ")
+    assert cache.stats() == {"hits": 2, "misses": 2}
+
+
+def test_cache_maps_symbols_to_the_ids_of_the_loading_process() -> None:
+    source_code = "cached_name + 1"
+    types, starts, ends, _, _ = pickle.loads(_dump_tokens(tokenize_to_buffer(source_code)))
+    # as if written by a process that numbered the names differently
+    columns = (types, starts, ends, array("l", [1000, 1001, NO_SYMBOL]), {1000: "cached_name", 1001: "+"})
+
+    tokens = _load_tokens(source_code, columns)
+    assert list(tokens.symbols) == [SYMBOLS.intern("cached_name"), PLUS, NO_SYMBOL]
+    assert parse(tokens) == parse(tokenize_to_buffer(source_code))
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path: Path) -> None:
+    cache = CompilationCache(str(tmp_path), max_size=4000)
+    for i in range(20):
+        cache.parse(f"var x{i} = {i}; x{i} + 1")
+
+    assert sum(f.stat().st_size for f in tmp_path.iterdir()) <= 4000
+    assert len(os.listdir(tmp_path)) < 40
+    # the most recent entries are kept
+    cache.parse("var x19 = 19; x19 + 1")
+    assert cache.hits == 1
+
+
+def test_cache_tokenizes_non_ascii_bytes_like_the_decoded_str(tmp_path: Path) -> None:
+    source_code = "var x = 1;\u00a0x + 1 # ä\n"
+
+    for cache in (CompilationCache(str(tmp_path)), CompilationCache(str(tmp_path))):
+        tokens = cache.tokenize(source_code.encode())
+        assert list(tokens) == list(tokenize_to_buffer(source_code))
+    # the second cache reads the tokens stored by the first one
+    assert cache.stats() == {"hits": 1, "misses": 0}
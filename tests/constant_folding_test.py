@@ -0,0 +1,47 @@
+from compiler.tokenizer import Location, tokenize
+from compiler.parser import parse
+from compiler.constant_folding import fold_constants
+from tests.tokenizer_test import L
+import compiler.ast as ast
+
+
+def fold(source_code: str) -> ast.Expression:
+    return fold_constants(parse(tokenize(source_code)))
+
+
+def test_folds_operations_on_literals() -> None:
+    assert fold("2 * 3 + 4") == ast.Literal(Location(column=6, line=0), 10)
+    assert fold("not true") == ast.Literal(Location(column=0, line=0), False)
+    assert fold("1 < 2 and 3 != 4") == ast.Literal(Location(column=6, line=0), True)
+    # rounded towards zero
+    assert fold("(0 - 7) / 2") == ast.Literal(Location(column=8, line=0), -3)
+    assert fold("(0 - 7) % 2") == ast.Literal(Location(column=8, line=0), -1)
+
+
+def test_folds_nested_expressions() -> None:
+    assert fold("while x < 2 * 3 do { y = 10 - 4 }") == ast.While(
+        L,
+        ast.BinaryOp(L, ast.Identifier(L, "x"), "<", ast.Literal(L, 6)),
+        ast.Block(L, [], ast.BinaryOp(L, ast.Identifier(L, "y"), "=", ast.Literal(L, 6))),
+    )
+    assert fold("f(1 + 1, { if true then a else b })") == ast.FunctionCall(
+        L, "f", [ast.Literal(L, 2), ast.Block(L, [], ast.Identifier(L, "a"))]
+    )
+
+
+def test_leaves_operations_that_fail_at_run_time() -> None:
+    for source_code in ["1 / 0", "5 % (1 - 1)", "9223372036854775807 + 1"]:
+        assert isinstance(fold(source_code), ast.BinaryOp)
+    assert isinstance(fold("-(0 - 9223372036854775807 - 1)"), ast.UnaryOp)
+
+
+def test_leaves_the_input_tree_unchanged() -> None:
+    tree = parse(tokenize("var x = 1 + 2; x + y"))
+    folded = fold_constants(tree)
+
+    assert tree == parse(tokenize("var x = 1 + 2; x + y"))
+    assert isinstance(tree, ast.Block) and isinstance(folded, ast.Block)
+    declaration = folded.statements[0]
+    assert isinstance(declaration, ast.VariableDeclaration)
+    assert declaration.initializer == ast.Literal(Location(column=10, line=0), 3)
+    assert folded.result is tree.result
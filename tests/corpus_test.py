@@ -0,0 +1,17 @@
+from benchmarks.corpus import CORPORA, generate
+from compiler.tokenizer import tokenize
+from compiler.parser import parse
+
+
+def test_corpora_are_deterministic() -> None:
+    for kind in CORPORA:
+        assert generate(kind, 2000) == generate(kind, 2000)
+        assert generate(kind, 2000, seed=1) != generate(kind, 2000)
+
+
+def test_corpora_have_requested_size_and_parse() -> None:
+    for kind in CORPORA:
+        source_code = generate(kind, 5000)
+
+        assert 5000 <= len(source_code) < 6000
+        parse(tokenize(source_code))
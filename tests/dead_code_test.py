@@ -0,0 +1,56 @@
+import re
+from compiler.tokenizer import tokenize
+from compiler.parser import parse
+from compiler.dead_code import eliminate_dead_code, is_pure
+from tests.tokenizer_test import L
+import compiler.ast as ast
+
+
+def eliminate(source_code: str) -> tuple[ast.Expression, int]:
+    return eliminate_dead_code(parse(tokenize(source_code)))
+
+
+# the tree without its locations, to compare it with a tree parsed from other source code
+def shape(node: ast.Expression) -> str:
+    return re.sub(r"location=Location\w*\([^)]*\), ", "", repr(node))
+
+
+def test_purity_of_expressions() -> None:
+    for source_code in ["1 + x", "not (a and b)", "if a then 1 else 2", "{ var x = 1; x / 2 }"]:
+        assert is_pure(parse(tokenize(source_code)))
+    for source_code in [
+        "x = 1",
+        "print_int(1)",
+        "read_int(1) + 1",
+        "while a do 1",
+        "x / y",
+        "x % 0",
+        "{ 1; print_bool(true); 2 }",
+        "var x = 1",
+    ]:
+        assert not is_pure(parse(tokenize(source_code)))
+
+
+def test_removes_pure_statements() -> None:
+    tree, removed = eliminate("1 + 2; x; print_int(1); var y = 2; { 3; x = 3 }; y")
+
+    assert shape(tree) == shape(parse(tokenize("print_int(1); var y = 2; { x = 3 }; y")))
+    assert removed == 5
+
+
+def test_prunes_unreachable_branches() -> None:
+    tree, removed = eliminate("if false then { print_int(1) }; while false do x = 1; 5")
+    assert tree == ast.Block(L, [], ast.Literal(L, 5))
+    assert removed == 10
+
+    tree, removed = eliminate("if true then print_int(1) else print_int(2)")
+    assert shape(tree) == shape(parse(tokenize("print_int(1)")))
+    assert removed == 4
+
+    tree, removed = eliminate("if true then { print_int(1); 2 }")
+    assert shape(tree) == shape(ast.Block(L, [parse(tokenize("{ print_int(1); 2 }"))]))
+    assert removed == 1
+
+    tree, removed = eliminate("while x do { 1; x = false }")
+    assert shape(tree) == shape(parse(tokenize("while x do { x = false }")))
+    assert removed == 1
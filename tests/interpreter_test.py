@@ -1,6 +1,7 @@
 from tests.tokenizer_test import L
 from compiler.tokenizer import tokenize
 from compiler.parser import parse
+import compiler.ast as ast
 from compiler.interpreter import Value, interpret
 import pytest
 
@@ -38,3 +39,10 @@ def test_interpreter_throws_exception_when_it_cannot_find_identifier() -> None:
         test_interpret("var x = 5; y")
 
     assert str(e.value) == f"{L}: could not find value for identifier y"
+
+
+def test_interpret_accepts_arena_views() -> None:
+    for source_code in ["1 + 2", "var x = 5; x", "if 1 < 2 then 3 else 4", "{ var y = 2; -y }"]:
+        tree = parse(tokenize(source_code))
+        arena = ast.Arena()
+        assert interpret(arena.view(arena.add(tree))) == interpret(tree)
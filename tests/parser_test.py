@@ -1,5 +1,6 @@
-from compiler.tokenizer import Token
-from compiler.parser import parse
+from collections.abc import Iterator
+from compiler.tokenizer import Location, Token, retokenize, tokenize, tokenize_to_buffer
+from compiler.parser import IncrementalParser, ParseError, parse, parse_stream
 from tests.tokenizer_test import L
 import compiler.ast as ast
 import pytest
@@ -554,7 +555,7 @@ def test_parser_parses_basic_block_with_no_result() -> None:
             Token("punctuation", ";", L),
             Token("punctuation", "}", L),
         ]
-    ) == ast.Block(L, [ast.Identifier(L, "a")], ast.Literal(None, None))
+    ) == ast.Block(L, [ast.Identifier(L, "a")], ast.NO_RESULT)
 
 
 def test_parser_parses_block_with_result() -> None:
@@ -781,9 +782,7 @@ def test_parser_parses_multiple_top_level_expressions_with_no_result() -> None:
             Token("identifier", "b", L),
             Token("punctuation", ";", L),
         ]
-    ) == ast.Block(
-        L, [ast.Identifier(L, "a"), ast.Identifier(L, "b")], ast.Literal(None, None)
-    )
+    ) == ast.Block(L, [ast.Identifier(L, "a"), ast.Identifier(L, "b")], ast.NO_RESULT)
 
 
 def test_parser_parses_multiple_top_level_expressions_with_result() -> None:
@@ -868,3 +867,204 @@ def test_parser_fails_when_right_parenthesis_missing() -> None:
         )
 
     assert str(exception.value) == f'{L}: expected ")"'
+
+
+def test_parser_parses_token_buffer() -> None:
+    source_code = "var x = 1; { x = x + 2 * 3; }; if x < 10 then print_int(x)"
+
+    assert parse(tokenize_to_buffer(source_code)) == parse(tokenize(source_code))
+
+
+def test_parser_parses_all_precedence_levels() -> None:
+    assert parse(tokenize("a = b or c and d == e < f + g * h - i")) == ast.BinaryOp(
+        L,
+        ast.Identifier(L, "a"),
+        "=",
+        ast.BinaryOp(
+            L,
+            ast.Identifier(L, "b"),
+            "or",
+            ast.BinaryOp(
+                L,
+                ast.Identifier(L, "c"),
+                "and",
+                ast.BinaryOp(
+                    L,
+                    ast.Identifier(L, "d"),
+                    "==",
+                    ast.BinaryOp(
+                        L,
+                        ast.Identifier(L, "e"),
+                        "<",
+                        ast.BinaryOp(
+                            L,
+                            ast.BinaryOp(
+                                L,
+                                ast.Identifier(L, "f"),
+                                "+",
+                                ast.BinaryOp(
+                                    L,
+                                    ast.Identifier(L, "g"),
+                                    "*",
+                                    ast.Identifier(L, "h"),
+                                ),
+                            ),
+                            "-",
+                            ast.Identifier(L, "i"),
+                        ),
+                    ),
+                ),
+            ),
+        ),
+    )
+
+
+def test_parser_parses_deep_nesting() -> None:
+    depth = 100_000
+    node = parse(tokenize_to_buffer("{" * depth + "1" + "}" * depth))
+
+    for _ in range(depth):
+        assert isinstance(node, ast.Block) and node.statements == []
+        node = node.result
+    assert node == ast.Literal(L, 1)
+
+    node = parse(tokenize("if a then not -(x) = " * 1000 + "1"))
+    for _ in range(1000):
+        assert isinstance(node, ast.Conditional)
+        node = node.then
+        assert isinstance(node, ast.UnaryOp) and node.op == "not"
+        node = node.right
+        assert isinstance(node, ast.UnaryOp) and node.op == "-"
+        node = node.right
+        assert isinstance(node, ast.BinaryOp) and node.op == "="
+        node = node.right
+    assert node == ast.Literal(L, 1)
+
+
+def test_parser_recovers_from_syntax_errors() -> None:
+    source_code = "var x = ; { a b; c } f(1 +); { }; x = 1 )"
+
+    with pytest.raises(ParseError) as e:
+        parse(tokenize(source_code), recover=True)
+    assert e.value.diagnostics == [
+        'Location(column=8, line=0): expected "(", "if", an integer literal or an identifier',
+        'Location(column=14, line=0): expected ";"',
+        'Location(column=26, line=0): expected "(", "if", an integer literal or an identifier',
+        'Location(column=40, line=0): expected "(", "if", an integer literal or an identifier',
+    ]
+
+    valid_source_code = "var x = 1; { x = x + 1 } x"
+    assert parse(tokenize(valid_source_code), recover=True) == parse(
+        tokenize(valid_source_code)
+    )
+
+
+def test_incremental_parser_matches_full_parse_after_edits() -> None:
+    source_code = "var x = 1;\n{ f(x); x = x + 1 }\nwhile x < 10 do { x = x * 2 }\nx"
+    tokens = tokenize_to_buffer(source_code)
+    parser = IncrementalParser()
+    first = parse(tokens)
+    assert parser.parse(tokens) == first
+
+    # a newline before the block moves every later location down one line
+    tokens, edit = retokenize(tokens, source_code.index("{"), 0, "\n")
+    second = parser.parse(tokens, edit)
+    assert second == parse(tokenize_to_buffer(tokens.source_code))
+    assert isinstance(second, ast.Block) and isinstance(first, ast.Block)
+    assert second.statements[1].location == Location(column=0, line=2)
+    assert second.result.location == Location(column=0, line=4)
+
+    # changing the last line reuses the earlier statements and the loop body as they are
+    tokens, edit = retokenize(tokens, len(tokens.source_code) - 1, 1, "x + 1")
+    third = parser.parse(tokens, edit)
+    assert third == parse(tokenize_to_buffer(tokens.source_code))
+    assert isinstance(third, ast.Block)
+    assert third.statements[1] is second.statements[1]
+    loop, previous_loop = third.statements[2], second.statements[2]
+    assert isinstance(loop, ast.While) and isinstance(previous_loop, ast.While)
+    assert loop.body is previous_loop.body
+
+
+def test_parse_stream_yields_top_level_expressions_lazily() -> None:
+    source_code = "var x = 1; { x = x + 1 } f(x);\nwhile x < 3 do x = x + 1; x"
+    full = parse(tokenize(source_code))
+    assert isinstance(full, ast.Block)
+
+    read = 0
+
+    def counted_tokens() -> Iterator[Token]:
+        nonlocal read
+        for token in tokenize(source_code):
+            read += 1
+            yield token
+
+    stream = parse_stream(counted_tokens())
+    assert next(stream) == full.statements[0]
+    # only the tokens of "var x = 1;" were read
+    assert read == 5
+    assert list(stream) == full.statements[1:] + [full.result]
+
+    assert list(parse_stream(tokenize("x"))) == [parse(tokenize("x"))]
+
+
+def test_parse_stream_recovers_from_syntax_errors() -> None:
+    stream = parse_stream(tokenize("a; b c +; d"), recover=True)
+    assert next(stream) == ast.Identifier(L, "a")
+    assert next(stream) == ast.Identifier(L, "b")
+    assert next(stream) == ast.Identifier(L, "d")
+    with pytest.raises(ParseError) as e:
+        next(stream)
+    assert len(e.value.diagnostics) == 1
+
+
+def test_parser_parses_block_bodies_lazily() -> None:
+    source_code = "var x = 1; { x = { f(x) }; while x < 3 do { x = x + 1 } } x"
+    block = parse(tokenize(source_code), lazy=True)
+    assert isinstance(block, ast.Block)
+    assert block == parse(tokenize(source_code))
+
+    # errors in a body are only found when it's read
+    block = parse(tokenize("{ a b }; c"), lazy=True)
+    assert isinstance(block, ast.Block) and isinstance(block.statements[0], ast.Block)
+    with pytest.raises(ParseError, match='expected ";"'):
+        block.statements[0].statements
+    with pytest.raises(ParseError, match="an integer literal or an identifier"):
+        parse(tokenize("{ a; { b }"), lazy=True)
+
+
+def test_parser_shares_the_no_result_sentinel() -> None:
+    program = parse(tokenize("{ a; }; { b; };"))
+    assert isinstance(program, ast.Block)
+    first, second = program.statements
+    assert isinstance(first, ast.Block) and isinstance(second, ast.Block)
+
+    assert first.result is second.result is ast.NO_RESULT
+    assert isinstance(ast.NO_RESULT, ast.Literal) and ast.NO_RESULT.value is None
+    with pytest.raises(AttributeError):
+        ast.NO_RESULT.value = 1
+    assert not hasattr(first, "__dict__")
+
+
+def test_parser_hash_conses_top_level_expressions() -> None:
+    source_code = "var a = { x * 2 }; var b = { x * 2 }; x * 2"
+    table = ast.HashCons()
+    tree = parse(tokenize(source_code), hash_cons=table)
+    assert isinstance(tree, ast.Block)
+    first, second = tree.statements
+    assert isinstance(first, ast.VariableDeclaration)
+    assert isinstance(second, ast.VariableDeclaration)
+    assert isinstance(first.initializer, ast.Block)
+
+    assert first.initializer is second.initializer
+    assert first.initializer.result is tree.result
+    assert len(table.locations(tree.result)) == 3
+
+    table = ast.HashCons()
+    expressions = list(parse_stream(tokenize(source_code), hash_cons=table))
+    declaration = expressions[0]
+    assert isinstance(declaration, ast.VariableDeclaration)
+    assert isinstance(declaration.initializer, ast.Block)
+    assert declaration.initializer.result is expressions[2]
+
+    with pytest.raises(ValueError):
+        parse(tokenize(source_code), lazy=True, hash_cons=ast.HashCons())
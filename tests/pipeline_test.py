@@ -0,0 +1,82 @@
+from pathlib import Path
+from typing import Any
+from compiler.cache import CompilationCache
+from compiler.pipeline import Pipeline, compiler_pipeline
+import compiler.ast as ast
+import pytest
+
+
+def test_pipeline_runs_passes_in_order_with_hooks() -> None:
+    calls: list[tuple[str, str, Any]] = []
+    pipeline = Pipeline()
+    pipeline.add("double", lambda value, counters: value * 2)
+    increment = pipeline.add("increment", lambda value, counters: value + 1)
+    increment.before.append(lambda name, value: calls.append(("before", name, value)))
+    pipeline.after.append(lambda name, value: calls.append(("after", name, value)))
+
+    assert pipeline.run(5) == 11
+    assert calls == [
+        ("after", "double", 10),
+        ("before", "increment", 10),
+        ("after", "increment", 11),
+    ]
+    assert [stats.name for stats in pipeline.stats] == ["double", "increment"]
+    assert pipeline.stats[0].peak_memory is None
+
+
+def test_pipeline_measures_memory_and_failing_passes() -> None:
+    def allocate(value: int, counters: dict[str, int]) -> list[int]:
+        counters["items"] = value
+        return list(range(value))
+
+    def fail(value: list[int], counters: dict[str, int]) -> None:
+        raise ValueError("pass failed")
+
+    pipeline = Pipeline(trace_memory=True)
+    pipeline.add("allocate", allocate)
+    pipeline.add("fail", fail)
+    with pytest.raises(ValueError):
+        pipeline.run(100_000)
+
+    allocated, failed = pipeline.stats
+    assert allocated.counters == {"items": 100_000}
+    assert allocated.memory is not None and allocated.memory > 100_000 * 8
+    assert allocated.peak_memory is not None and allocated.peak_memory >= allocated.memory
+    assert failed.name == "fail" and failed.seconds > 0
+    assert "allocate" in pipeline.report() and "items=100000" in pipeline.report()
+    assert pipeline.stats_json()[0]["counters"] == {"items": 100_000}
+
+
+def test_compiler_pipeline_checks_and_optimizes() -> None:
+    pipeline = compiler_pipeline()
+    tree = pipeline.run("var x = 2 * 3; while false do x = 1; 1 + 1; x")
+
+    assert [stats.name for stats in pipeline.stats] == [
+        "tokenize",
+        "parse",
+        "typecheck",
+        "fold_constants",
+        "eliminate_dead_code",
+    ]
+    # the loop and `2`, which `1 + 1` was folded into
+    assert pipeline.stats[-1].counters == {"removed_nodes": 6}
+    assert tree.statements[0].initializer == ast.Literal(tree.statements[0].initializer.location, 6)
+
+    no_optimizations = compiler_pipeline(constant_folding=False, dead_code_elimination=False)
+    no_optimizations.run("1 + 1")
+    assert [stats.name for stats in no_optimizations.stats] == ["tokenize", "parse", "typecheck"]
+
+
+def test_compiler_pipeline_reads_files_in_the_first_pass(tmp_path: Path) -> None:
+    path = tmp_path / "source.txt"
+    path.write_text("var x = 1; x + 2\n")
+
+    pipeline = compiler_pipeline(read_file=True)
+    assert pipeline.run(str(path)) == compiler_pipeline().run("var x = 1; x + 2\n")
+    assert pipeline.stats[0].name == "tokenize"
+    assert pipeline.stats[0].counters == {"tokens": 8}
+
+    cached = compiler_pipeline(CompilationCache(str(tmp_path / "cache")), read_file=True)
+    cached.run(str(path))
+    assert [stats.name for stats in cached.stats][:2] == ["read", "parse"]
+    assert cached.stats[0].counters == {"bytes": 17}
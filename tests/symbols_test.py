@@ -0,0 +1,36 @@
+from compiler.symbols import IF, NO_SYMBOL, SYMBOLS, SymbolTable
+from compiler.tokenizer import tokenize, tokenize_to_buffer
+from compiler.parser import parse
+import compiler.ast as ast
+
+
+def test_symbol_table_gives_each_name_one_id() -> None:
+    table = SymbolTable()
+
+    a = table.intern("a")
+    b = table.intern("b")
+
+    assert a != b
+    assert table.intern("a") == a
+    assert table.name(b) == "b"
+
+
+def test_tokens_are_interned_at_lex_time() -> None:
+    tokens = tokenize("if x then 12")
+    buffer = tokenize_to_buffer("if x then 12")
+
+    assert tokens[0].symbol == IF
+    assert tokens[1].symbol == SYMBOLS.intern("x")
+    assert tokens[3].symbol == NO_SYMBOL
+    assert list(buffer.symbols) == [token.symbol for token in tokens]
+
+
+def test_ast_nodes_share_interned_names() -> None:
+    node = parse(tokenize("var name_a = 1; name_a + name_a"))
+
+    assert isinstance(node, ast.Block)
+    assert isinstance(node.result, ast.BinaryOp)
+    assert isinstance(node.result.left, ast.Identifier)
+    assert isinstance(node.result.right, ast.Identifier)
+    assert node.result.left.symbol == SYMBOLS.intern("name_a")
+    assert node.result.left.name is node.result.right.name
@@ -1,5 +1,20 @@
 from dataclasses import dataclass
-from compiler.tokenizer import Location, Token, tokenize
+import io
+from pathlib import Path
+import pickle
+import pytest
+from compiler.tokenizer import (
+    LineIndex,
+    Location,
+    Token,
+    TokenEdit,
+    iter_tokens,
+    retokenize,
+    tokenize,
+    tokenize_file,
+    tokenize_parallel,
+    tokenize_to_buffer,
+)
 
 
 @dataclass(frozen=True)
@@ -111,3 +126,181 @@ def test_tokenizer_skips_over_comments() -> None:
     assert tokenize("# 1\n// 2\n 3") == [
         Token(type="int_literal", text="3", location=L)
     ]
+
+
+### STREAMING ###
+STREAM_SOURCE = "var x = 1;\n# a comment\n  while x <= 100 do {\n\txy_z = x * 2; // done\n}\n\n1"
+
+
+def test_iter_tokens_matches_tokenize_for_every_chunk_size() -> None:
+    expected = tokenize(STREAM_SOURCE)
+
+    for chunk_size in range(1, len(STREAM_SOURCE) + 2):
+        tokens = list(iter_tokens(io.StringIO(STREAM_SOURCE), chunk_size))
+        assert tokens == expected
+
+
+def test_iter_tokens_reads_binary_streams() -> None:
+    # "\xa0" is whitespace that takes two bytes in UTF-8
+    source = "a\xa0b\n\xa0c"
+    for chunk_size in range(1, 5):
+        tokens = list(iter_tokens(io.BytesIO(source.encode()), chunk_size))
+        assert tokens == tokenize(source)
+
+
+def test_iter_tokens_is_lazy() -> None:
+    stream = io.StringIO("a\n" * 1000)
+    tokens = iter_tokens(stream, chunk_size=4)
+
+    assert next(tokens) == Token("identifier", "a", Location(column=0, line=0))
+    assert stream.tell() < 10
+
+
+### TOKEN BUFFER ###
+def test_token_buffer_matches_tokenize() -> None:
+    buffer = tokenize_to_buffer(STREAM_SOURCE)
+
+    assert len(buffer) == len(tokenize(STREAM_SOURCE))
+    assert list(buffer) == tokenize(STREAM_SOURCE)
+    assert buffer[-1] == tokenize(STREAM_SOURCE)[-1]
+    assert buffer[1:3] == tokenize(STREAM_SOURCE)[1:3]
+
+
+def test_token_buffer_reads_single_columns() -> None:
+    buffer = tokenize_to_buffer("x\n  <= 12")
+
+    assert buffer.type(1) == "operator"
+    assert buffer.text(1) == "<="
+    assert buffer.location(2) == Location(column=5, line=1)
+
+
+def test_tokenize_file_matches_tokenize(tmp_path: Path) -> None:
+    path = tmp_path / "source.txt"
+    path.write_text(STREAM_SOURCE)
+
+    assert list(tokenize_file(str(path))) == tokenize(STREAM_SOURCE)
+
+
+def test_tokenize_file_handles_empty_file(tmp_path: Path) -> None:
+    path = tmp_path / "empty.txt"
+    path.write_text("")
+
+    assert len(tokenize_file(str(path))) == 0
+
+
+def test_tokenize_file_accepts_non_ascii_whitespace(tmp_path: Path) -> None:
+    source_code = "var x\u00a0= 1;\n\u2003x + 2 // ä\n"
+    path = tmp_path / "source.txt"
+    path.write_text(source_code, encoding="utf-8")
+
+    assert list(tokenize_file(str(path))) == tokenize(source_code)
+
+
+def test_tokenize_file_fails_on_non_ascii_character(tmp_path: Path) -> None:
+    path = tmp_path / "source.txt"
+    path.write_text("a = ä", encoding="utf-8")
+
+    with pytest.raises(Exception) as e:
+        tokenize_file(str(path))
+
+    assert (
+        str(e.value)
+        == "Location(column=4, line=0): non-ASCII character in source code"
+    )
+
+
+### PARALLEL ###
+def test_tokenize_parallel_matches_tokenize() -> None:
+    source_code = (STREAM_SOURCE + "\n") * 20
+
+    buffer = tokenize_parallel(source_code, workers=3, threshold=0)
+
+    assert list(buffer) == tokenize(source_code)
+
+
+def test_tokenize_parallel_reports_errors_with_whole_source_position() -> None:
+    with pytest.raises(Exception) as e:
+        tokenize_parallel("a\n" * 100 + "b ä", workers=3, threshold=0)
+
+    assert e.value.args == (
+        "No match found, position: ",
+        202,
+        ", source code at position: ",
+        "ä",
+    )
+
+
+### BYTES ###
+def test_tokenizer_reads_bytes_like_the_same_str() -> None:
+    source_code = STREAM_SOURCE.encode()
+
+    assert list(tokenize_to_buffer(source_code)) == tokenize(STREAM_SOURCE)
+    assert list(tokenize_to_buffer(memoryview(source_code))) == tokenize(STREAM_SOURCE)
+
+
+def test_tokenizer_fails_on_non_ascii_bytes_with_location() -> None:
+    with pytest.raises(Exception) as e:
+        tokenize_to_buffer("a = 1;\n  b = ä".encode())
+
+    assert (
+        str(e.value)
+        == "Location(column=6, line=1): non-ASCII character in source code"
+    )
+
+
+def test_tokenizer_fails_on_non_ascii_str_with_position() -> None:
+    with pytest.raises(Exception) as e:
+        tokenize_to_buffer("a ä")
+
+    assert e.value.args == (
+        "No match found, position: ",
+        2,
+        ", source code at position: ",
+        "ä",
+    )
+
+
+### LAZY LOCATIONS ###
+def test_line_index_finds_line_and_column() -> None:
+    index = LineIndex("ab\n\ncd\n", first_line=3)
+
+    assert index.line_and_column(0) == (3, 0)
+    assert index.line_and_column(2) == (3, 2)
+    assert index.line_and_column(3) == (4, 0)
+    assert index.line_and_column(5) == (5, 1)
+
+
+def test_lazy_location_behaves_like_location() -> None:
+    location = Location.at(LineIndex("ab\n  cd"), 5)
+
+    assert location == Location(column=2, line=1)
+    assert str(location) == "Location(column=2, line=1)"
+    assert hash(location) == hash(Location(column=2, line=1))
+    assert pickle.loads(pickle.dumps(location)) == Location(column=2, line=1)
+
+
+### RETOKENIZING ###
+def test_retokenize_matches_tokenizing_the_edited_source() -> None:
+    edits = [
+        (0, 0, "var "),
+        (7, 1, "= ="),
+        (12, 0, "// "),
+        (len(STREAM_SOURCE) - 1, 1, "1 2 3\n// x\n"),
+        (11, 14, ""),
+    ]
+    for position, removed, inserted in edits:
+        buffer, _ = retokenize(
+            tokenize_to_buffer(STREAM_SOURCE), position, removed, inserted
+        )
+        edited = STREAM_SOURCE[:position] + inserted + STREAM_SOURCE[position + removed :]
+
+        assert buffer.source_code == edited
+        assert list(buffer) == tokenize(edited)
+
+
+def test_retokenize_only_replaces_edited_tokens() -> None:
+    buffer, edit = retokenize(tokenize_to_buffer("a = 1;\nb = 2;\nc = 3;"), 11, 1, "22")
+
+    assert edit == TokenEdit(start=4, old_end=7, new_end=7, shift=1)
+    assert buffer.text(6) == "22"
+    assert buffer.text(9) == "="
@@ -1,5 +1,6 @@
 from compiler.tokenizer import tokenize
 from compiler.parser import parse
+import compiler.ast as ast
 from compiler.type_checker import typecheck
 from compiler.types import *
 import pytest
@@ -17,6 +18,23 @@ def test_type_basic_arithmetic() -> None:
     assert type_check("1 / 2") == Int
 
 
+def test_type_check_fails_on_wrong_operand_types() -> None:
+    expected = (
+        "Type check error: expected BinaryOp argument types "
+        "[BasicType(name='Int'), BasicType(name='Int')], "
+        "received (BasicType(name='Int'), BasicType(name='Bool'))"
+    )
+    tree = parse(tokenize("1 + true"))
+    with pytest.raises(Exception) as e:
+        typecheck(tree)
+    assert str(e.value).endswith(expected)
+
+    arena = ast.Arena()
+    with pytest.raises(Exception) as e:
+        typecheck(arena.view(arena.add(tree)))
+    assert str(e.value).endswith(expected)
+
+
 def test_type_basic_comparisons() -> None:
     assert type_check("1 < 2") == Bool
     assert type_check("1 <= 2") == Bool
@@ -126,3 +144,18 @@ def test_type_of_built_in_functions() -> None:
         type_check("print_int(true)")
 
     assert "types of function arguments do not match expected types" in str(e1.value)
+
+
+def test_typecheck_accepts_arena_views() -> None:
+    for source_code in [
+        "var x: Int = 1; { x = x + 2 * 3 } if x < 10 then { print_int(1) } else { x = 2 }",
+        "var b = not true; while b do { b = false }; -1",
+        "{ 1 }",
+    ]:
+        tree = parse(tokenize(source_code))
+        arena = ast.Arena()
+        assert typecheck(arena.view(arena.add(tree))) == typecheck(tree)
+
+    arena = ast.Arena()
+    with pytest.raises(Exception, match="could not find type for symbol y"):
+        typecheck(arena.view(arena.add(parse(tokenize("var x = 1; y")))))
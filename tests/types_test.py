@@ -0,0 +1,35 @@
+import copy
+import pickle
+
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from compiler.types import BasicType, Bool, FunType, Int, Unit
+import compiler.ast as ast
+
+
+def test_types_are_interned() -> None:
+    assert BasicType("Int") is Int
+    assert FunType([Int, Int], Bool) is FunType((Int, Int), Bool)
+    assert FunType((Int,), Bool) is not FunType((Bool,), Bool)
+    assert FunType((Int,), Unit).argument_types == (Int,)
+
+
+def test_types_can_be_dict_keys() -> None:
+    names = {Int: "Int", FunType((Int, Int), Int): "arithmetic"}
+
+    assert names[BasicType("Int")] == "Int"
+    assert names[FunType([Int, Int], Int)] == "arithmetic"
+
+
+def test_copied_and_unpickled_types_are_the_interned_ones() -> None:
+    fun_type = FunType((Int, Bool), Unit)
+
+    assert pickle.loads(pickle.dumps(fun_type)) is fun_type
+    assert copy.deepcopy(fun_type) is fun_type
+
+
+def test_parser_reuses_declared_types() -> None:
+    node = parse(tokenize("var x: Bool = true"))
+
+    assert isinstance(node, ast.VariableDeclaration)
+    assert node.declared_type is Bool